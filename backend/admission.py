@@ -0,0 +1,185 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Sequence, Tuple
+
+import metrics
+
+
+# Priority classes, highest first. Exempt requests bypass the limiter.
+EXEMPT = "exempt"
+DEFAULT = "default"
+BULK = "bulk"
+PRIORITIES = (DEFAULT, BULK)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit driven by storage latency.
+
+    Every `window` seconds the average DB call latency of completed requests
+    is compared with `target_latency`: above it the limit is cut by
+    `backoff`, otherwise it grows by one if requests actually ran into the
+    limit during the window. Bulk requests may only use `bulk_share` of the
+    limit, so they are shed first and never starve default traffic. Requests
+    over the limit wait up to `max_wait` in a queue of at most `max_queue`;
+    freed slots go to default waiters before bulk ones.
+    """
+
+    def __init__(self, initial: int = 100, min_limit: int = 10, max_limit: int = 1000,
+                 target_latency: float = 0.1, backoff: float = 0.8, window: float = 1.0,
+                 bulk_share: float = 0.5, max_queue: int = 100, max_wait: float = 0.1,
+                 clock=time.monotonic):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.window = window
+        self.bulk_share = bulk_share
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.clock = clock
+        self.in_flight: Dict[str, int] = {p: 0 for p in PRIORITIES}
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+        self._window_start = clock()
+        self._db_seconds = 0.0
+        self._db_calls = 0
+        self._saturated = False
+        metrics.admission_limit.set(value=self.limit)
+
+    def _capacity(self, priority: str) -> float:
+        return self.limit * self.bulk_share if priority == BULK else self.limit
+
+    def _can_admit(self, priority: str) -> bool:
+        if priority == BULK and self.in_flight[BULK] >= self._capacity(BULK):
+            return False
+        return sum(self.in_flight.values()) < self.limit
+
+    def _admit(self, priority: str):
+        self.in_flight[priority] += 1
+        metrics.admission_in_flight.inc(priority)
+
+    async def acquire(self, priority: str) -> bool:
+        if self._can_admit(priority) and not any(self._waiters[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1]):
+            self._admit(priority)
+            return True
+        self._saturated = True
+        if self.max_wait <= 0 or sum(len(q) for q in self._waiters.values()) >= self.max_queue:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            # release() admits the waiter before resolving its future
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Admitted just as the caller went away: pass the slot on
+                self.release(priority)
+            else:
+                self._discard(priority, waiter)
+            raise
+        if waiter.done() and not waiter.cancelled():
+            return True
+        self._discard(priority, waiter)
+        return False
+
+    def _discard(self, priority: str, waiter: asyncio.Future):
+        waiter.cancel()
+        try:
+            self._waiters[priority].remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, priority: str, db_seconds: float = 0.0, db_calls: int = 0):
+        self.in_flight[priority] -= 1
+        metrics.admission_in_flight.dec(priority)
+        self._db_seconds += db_seconds
+        self._db_calls += db_calls
+        self._maybe_adjust()
+        self._wake()
+
+    def _wake(self):
+        for priority in PRIORITIES:
+            queue = self._waiters[priority]
+            while queue and self._can_admit(priority):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self._admit(priority)
+                waiter.set_result(True)
+
+    def _maybe_adjust(self):
+        now = self.clock()
+        if now - self._window_start < self.window:
+            return
+        if self._db_calls and self._db_seconds / self._db_calls > self.target_latency:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+        elif self._saturated:
+            self.limit = min(self.max_limit, self.limit + 1)
+        self._window_start = now
+        self._db_seconds = 0.0
+        self._db_calls = 0
+        self._saturated = False
+        metrics.admission_limit.set(value=self.limit)
+
+
+class AdmissionMiddleware:
+    """Sheds load with a fast 503 instead of queueing without bound.
+
+    Requests are classed by path prefix: `exempt` prefixes (cached reads,
+    event streams, health and metrics) are never limited; `bulk` prefixes
+    (notify, exports, batch writes) get the smaller share; everything else
+    is default priority.
+    """
+
+    def __init__(self, app, limiter: AdaptiveLimiter, exempt: Sequence[str] = (), bulk: Sequence[str] = (),
+                 retry_after: int = 1):
+        self.app = app
+        self.limiter = limiter
+        self.rules: Tuple[Tuple[str, str], ...] = tuple(
+            [(prefix, EXEMPT) for prefix in exempt] + [(prefix, BULK) for prefix in bulk]
+        )
+        self.retry_after = retry_after
+
+    def _priority(self, path: str) -> str:
+        for prefix, priority in self.rules:
+            if path.startswith(prefix):
+                return priority
+        return DEFAULT
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        priority = self._priority(scope["path"])
+        if priority == EXEMPT:
+            await self.app(scope, receive, send)
+            return
+        if not await self.limiter.acquire(priority):
+            metrics.admission_rejected.inc(priority)
+            await self._reject(send)
+            return
+        # Set by ServerTimingMiddleware, which must wrap this one
+        stats: Optional[metrics.RequestDbStats] = metrics.current_db_stats.get()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if stats:
+                self.limiter.release(priority, stats.seconds, len(stats.calls))
+            else:
+                self.limiter.release(priority)
+
+    async def _reject(self, send):
+        body = b'{"detail":"Server busy, please retry"}'
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: response_model serialization vs the fast path in server.py.
+
+The validated path reproduces what FastAPI does for a list endpoint today:
+build one model per document, validate against response_model, run
+jsonable_encoder and render a JSONResponse. The fast path projects the raw
+documents and encodes them with server.dumps (orjson when installed).
+
+    python backend/benchmarks/bench_serialization.py [--sizes 1000 10000] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+
+
+def status_docs(n: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    return [
+        {"id": str(uuid.uuid4()), "client_name": f"probe-{i % 50}", "timestamp": start + timedelta(seconds=i, microseconds=123000)}
+        for i in range(n)
+    ]
+
+
+def email_docs(n: int) -> List[dict]:
+    start = datetime(2024, 1, 1)
+    return [
+        {"email": f"user{i}@example.com", "created_at": start + timedelta(minutes=i), "updated_at": start + timedelta(minutes=i, seconds=30)}
+        for i in range(n)
+    ]
+
+
+CASES = [
+    ("status", server.StatusCheck, status_docs, server.STATUS_FIELDS),
+    ("emails", server.EmailOut, email_docs, server.EMAIL_FIELDS),
+]
+
+
+async def validated(model, field, docs) -> bytes:
+    content = await serialize_response(field=field, response_content=[model(**d) for d in docs], is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def fast(fields, docs) -> bytes:
+    return server.dumps(server.project(docs, fields))
+
+
+async def timeit(fn, repeat: int) -> float:
+    await fn()  # warm-up
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+async def main(sizes: List[int], repeat: int):
+    encoder = "orjson" if server.orjson is not None else "json (orjson not installed)"
+    print(f"fast path encoder: {encoder}; best of {repeat} runs\n")
+    print(f"{'payload':<10}{'items':>8}{'validated ms':>15}{'fast ms':>10}{'speedup':>10}")
+    for name, model, make, fields in CASES:
+        field = create_response_field(name="Response", type_=List[model])
+        for n in sizes:
+            docs = make(n)
+            slow_ms = await timeit(lambda: validated(model, field, docs), repeat)
+            fast_ms = await timeit(lambda: fast(fields, docs), repeat)
+            print(f"{name:<10}{n:>8}{slow_ms:>15.2f}{fast_ms:>10.2f}{slow_ms / fast_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
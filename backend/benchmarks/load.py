@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Concurrent load benchmark for the backend API.
+
+Drives the ASGI app in-process (default) or a running server (--url) with a
+fixed number of requests per scenario at the given concurrency, and reports
+RPS and p50/p95/p99 latency. Results can be saved as JSON and compared with a
+previous run to catch regressions.
+
+    # in-process against a local mongod (MONGO_URL / DB_NAME from backend/.env)
+    python backend/benchmarks/load.py --concurrency 50 --requests 2000
+
+    # in-process on the in-memory storage backend (STORAGE_BACKEND=memory)
+    python backend/benchmarks/load.py --in-memory --output bench.json
+
+    # against a running server, failing on >10% regressions vs a baseline
+    python backend/benchmarks/load.py --url http://localhost:8001 --compare bench.json --tolerance 0.1
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+SESSION_POOL = 500
+STATUS_SEED = 1000
+
+
+# ----------------------
+# Scenarios
+# ----------------------
+# Each scenario has an optional setup and a request factory called with the
+# request number.
+class Scenario:
+    def __init__(self, name: str, request: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]],
+                 setup: Optional[Callable[[httpx.AsyncClient], Awaitable[None]]] = None):
+        self.name = name
+        self.request = request
+        self.setup = setup
+
+
+_run_id = uuid.uuid4().hex[:8]
+
+
+async def _seed_preferences(client: httpx.AsyncClient):
+    for i in range(SESSION_POOL):
+        r = await client.post("/api/preferences", json={"palette_id": "arctic", "session_id": f"bench-{_run_id}-{i}"})
+        r.raise_for_status()
+
+
+async def _seed_status(client: httpx.AsyncClient):
+    batch = [{"client_name": f"bench-{i % 10}"} for i in range(STATUS_SEED)]
+    r = await client.post("/api/status/batch", json=batch)
+    r.raise_for_status()
+
+
+def _notify(client: httpx.AsyncClient, i: int):
+    # Unique email and client IP per request so the rate limiter never trips.
+    return client.post(
+        "/api/notify",
+        json={"email": f"bench-{_run_id}-{i}@example.com"},
+        headers={"X-Forwarded-For": f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"},
+    )
+
+
+SCENARIOS: Dict[str, Scenario] = {s.name: s for s in [
+    Scenario("palettes", lambda c, i: c.get("/api/palettes")),
+    Scenario("preferences", lambda c, i: c.get(
+        "/api/preferences", params={"session_id": f"bench-{_run_id}-{i % SESSION_POOL}"}), setup=_seed_preferences),
+    Scenario("preferences-write", lambda c, i: c.post(
+        "/api/preferences", json={"palette_id": "mint", "session_id": f"bench-{_run_id}-{i % SESSION_POOL}"})),
+    Scenario("notify", _notify),
+    Scenario("status", lambda c, i: c.get("/api/status", params={"limit": 100}), setup=_seed_status),
+    Scenario("status-write", lambda c, i: c.post("/api/status", json={"client_name": f"bench-{i % 10}"})),
+]}
+DEFAULT_SCENARIOS = ["palettes", "preferences", "notify", "status"]
+
+
+# ----------------------
+# Runner
+# ----------------------
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, total: int, concurrency: int, warmup: int) -> dict:
+    if scenario.setup:
+        await scenario.setup(client)
+    # Warm-up numbers follow the measured ones so unique keys (notify) never repeat.
+    for i in range(total, total + warmup):
+        await scenario.request(client, i)
+
+    counter = itertools.count()
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            t0 = time.perf_counter()
+            try:
+                r = await scenario.request(client, i)
+                statuses[str(r.status_code)] += 1
+            except httpx.HTTPError as exc:
+                errors[type(exc).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = sum(n for code, n in statuses.items() if code.startswith("2") or code == "304")
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "ok": ok,
+        "status_codes": dict(statuses),
+        "errors": dict(errors),
+    }
+
+
+async def _open_client(args) -> tuple:
+    """Returns (client, shutdown coroutine factory, target description)."""
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url.rstrip("/"), timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+        return client, None, args.url
+
+    if args.in_memory:
+        # Must be set before server builds its storage at import time.
+        os.environ["STORAGE_BACKEND"] = "memory"
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    import server
+
+    # server turns on INFO logging; httpx would then log every request inside
+    # the timed loop and skew the numbers.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # httpx's ASGI transport does not run lifespan events, so drive them here.
+    await server.app.router.startup()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=args.timeout)
+    target = f"in-process ({server.storage.name} storage)"
+    return client, server.app.router.shutdown, target
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        if previous["rps"] and current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+        if previous["p99_ms"] and current["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['p99_ms']}ms -> {current['p99_ms']}ms")
+    return regressions
+
+
+async def main(args) -> int:
+    client, shutdown, target = await _open_client(args)
+    results = {
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "target": target,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "scenarios": {},
+    }
+    print(f"target: {target}  concurrency: {args.concurrency}  requests/scenario: {args.requests}\n")
+    print(f"{'scenario':<20}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ok':>8}")
+    try:
+        for name in args.scenarios:
+            stats = await run_scenario(client, SCENARIOS[name], args.requests, args.concurrency, args.warmup)
+            results["scenarios"][name] = stats
+            print(f"{name:<20}{stats['rps']:>10}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['ok']:>8}")
+    finally:
+        await client.aclose()
+        if shutdown:
+            await shutdown()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nresults written to {args.output}")
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+        if regressions:
+            print("\nREGRESSIONS vs " + args.compare)
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"\nno regressions vs {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--in-memory", action="store_true", help="In-process only: use the in-memory storage backend")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=DEFAULT_SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Sequential warm-up requests per scenario")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Write JSON results to this path")
+    parser.add_argument("--compare", help="Baseline JSON from a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative rps drop / p99 increase")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+logger = logging.getLogger(__name__)
+
+# Returned by TTLCache.get when there is no usable entry.
+MISS = object()
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry.
+
+    `set_missing` stores a negative entry (returned as None by `get`) with its
+    own, usually shorter, TTL so repeated lookups of unknown keys stay cheap.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30.0, negative_ttl: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISS
+        expires, value = entry
+        if expires <= self.clock():
+            del self._data[key]
+            return MISS
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._put(key, value, self.ttl)
+
+    def set_missing(self, key: Hashable):
+        self._put(key, None, self.negative_ttl)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not MISS
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _put(self, key, value, ttl):
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        self._data[key] = (self.clock() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one.
+
+    The first caller starts `fn()` as a task; callers arriving while it runs
+    await the same task and get its result or exception. Each caller waits
+    through a shield, so a cancelled caller (e.g. a client disconnect) never
+    cancels the shared call for the others. The key is released as soon as
+    the call finishes, so nothing is cached here.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable):
+        """Let the next caller start a fresh call, e.g. after a write made the
+        in-flight result stale."""
+        self._calls.pop(key, None)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+class WriteGenerations:
+    """Lets a read tell whether a write to its key landed while it was in
+    flight, so it doesn't fill the cache with a result older than the one
+    the write just stored.
+
+    A read takes a token with `begin` and hands it back to `end`, which
+    returns False if `bump` (or `bump_all`) ran for that key in between.
+    Only keys with reads in flight are tracked.
+    """
+
+    def __init__(self):
+        # key -> [generation, reads in flight]
+        self._keys: Dict[Hashable, list] = {}
+
+    def begin(self, key: Hashable) -> int:
+        entry = self._keys.setdefault(key, [0, 0])
+        entry[1] += 1
+        return entry[0]
+
+    def end(self, key: Hashable, token: int) -> bool:
+        entry = self._keys[key]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._keys[key]
+        return entry[0] == token
+
+    def bump(self, key: Hashable):
+        entry = self._keys.get(key)
+        if entry is not None:
+            entry[0] += 1
+
+    def bump_all(self):
+        for entry in self._keys.values():
+            entry[0] += 1
+
+
+async def follow_change_stream(collection, apply: Callable[[dict], None],
+                               on_reset: Callable[[], None], retry_delay: float = 5.0):
+    """Feed change events of `collection` to `apply` until cancelled.
+
+    Update events carry the post-image (updateLookup). `on_reset` is called
+    whenever the stream (re)starts, since events may have been missed while
+    it was down. Returns quietly if the deployment has no change streams
+    (standalone mongod), leaving callers on TTL expiry alone.
+    """
+    while True:
+        try:
+            async with collection.watch(full_document="updateLookup") as stream:
+                on_reset()
+                async for change in stream:
+                    apply(change)
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as exc:
+            # 40573: change streams need a replica set or sharded cluster
+            if exc.code == 40573:
+                logger.warning("Change streams unavailable on %s; relying on TTL expiry", collection.name)
+                return
+            logger.warning("Change stream on %s failed (%s); retrying in %ss", collection.name, exc, retry_delay)
+        except PyMongoError as exc:
+            logger.warning("Change stream on %s failed (%s); retrying in %ss", collection.name, exc, retry_delay)
+        await asyncio.sleep(retry_delay)
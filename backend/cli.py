@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Management commands for the backend.
+
+    python cli.py migrate            # create indexes/schema and seed palettes if the specs changed
+    python cli.py migrate --force    # re-run everything regardless of stored versions
+    python cli.py backfill-rollups   # recompute status rollup buckets from raw checks
+    python cli.py serve --workers 4  # run the API (uvloop + httptools) with graceful drain
+"""
+
+import asyncio
+import signal
+from datetime import datetime
+from typing import Optional
+
+import typer
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+# `server` is imported inside the commands: importing it builds the storage
+# client, which the serve supervisor must not open before it starts workers.
+
+
+cli = typer.Typer(help="Timepage backend management commands.", no_args_is_help=True)
+
+
+@cli.callback()
+def main():
+    """Timepage backend management commands."""
+
+
+@cli.command()
+def migrate(force: bool = typer.Option(False, "--force", help="Ignore stored spec hashes and re-apply everything.")):
+    """Apply index specs and seed data recorded in server.py."""
+    import server
+
+    async def run():
+        try:
+            await server.ensure_indexes_and_seed(force=force)
+        finally:
+            await server.storage.close()
+
+    asyncio.run(run())
+    typer.echo("Migration complete")
+
+
+@cli.command("backfill-rollups")
+def backfill_rollups(
+    since: Optional[datetime] = typer.Option(None, help="Only checks at or after this UTC time."),
+    until: Optional[datetime] = typer.Option(None, help="Only checks before this UTC time."),
+):
+    """Rebuild status rollup buckets from raw status checks."""
+    import server
+
+    async def run():
+        try:
+            await server.backfill_status_rollups(since, until)
+        finally:
+            await server.storage.close()
+
+    asyncio.run(run())
+    typer.echo("Backfill complete")
+
+
+class DrainingServer(uvicorn.Server):
+    """On the first SIGTERM/SIGINT the worker keeps serving for `drain_seconds`
+    with readiness failing, so the load balancer stops routing to it first;
+    only then does uvicorn close the listener and wait for in-flight requests.
+    Another SIGINT while draining stops right away; repeated SIGTERMs (the
+    supervisor relaying one the worker already got) are ignored."""
+
+    def __init__(self, config: uvicorn.Config, drain_seconds: float):
+        super().__init__(config)
+        self.drain_seconds = drain_seconds
+        self.draining = False
+
+    def handle_exit(self, sig, frame):
+        if self.drain_seconds <= 0 or (self.draining and sig == signal.SIGINT):
+            super().handle_exit(sig, frame)
+            return
+        if self.draining:
+            return
+        self.draining = True
+        import server  # already loaded by uvicorn in this worker
+
+        server.begin_drain()
+        asyncio.get_running_loop().call_later(self.drain_seconds, super().handle_exit, sig, frame)
+
+
+@cli.command()
+def serve(
+    host: str = typer.Option("0.0.0.0", envvar="HOST"),
+    port: int = typer.Option(8001, envvar="PORT"),
+    workers: int = typer.Option(1, envvar="WEB_CONCURRENCY", help="Worker processes sharing the socket."),
+    loop: str = typer.Option("uvloop", help="Event loop: uvloop, asyncio or auto."),
+    http: str = typer.Option("httptools", help="HTTP parser: httptools, h11 or auto."),
+    drain_seconds: float = typer.Option(
+        5.0, envvar="DRAIN_SECONDS", help="After SIGTERM, keep serving this long with /readyz failing."),
+    graceful_timeout: int = typer.Option(
+        30, envvar="GRACEFUL_TIMEOUT", help="Then wait this long for in-flight requests before cancelling them."),
+    keep_alive: int = typer.Option(5, help="Idle keep-alive timeout in seconds."),
+    access_log: bool = typer.Option(False, help="Log every request (metrics already count them)."),
+):
+    """Run the API. Each worker migrates, loads its caches and warms its
+    connection pool before it accepts connections."""
+    config = uvicorn.Config(
+        "server:app",
+        host=host,
+        port=port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=graceful_timeout,
+        timeout_keep_alive=keep_alive,
+        access_log=access_log,
+        proxy_headers=True,
+    )
+    http_server = DrainingServer(config, drain_seconds)
+    if config.workers > 1:
+        Multiprocess(config, target=http_server.run, sockets=[config.bind_socket()]).run()
+    else:
+        http_server.run()
+        if not http_server.started:
+            raise typer.Exit(3)
+
+
+if __name__ == "__main__":
+    cli()
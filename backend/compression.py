@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+
+# Preferred first when the client accepts several
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if level is None else level)
+    # mtime=0 keeps output (and anything hashed from it) deterministic
+    return gzip.compress(body, compresslevel=9 if level is None else level, mtime=0)
+
+
+def choose_encoding(accept_encoding: Optional[str], available: Iterable[str] = ENCODINGS) -> Optional[str]:
+    """The preferred encoding in `available` that Accept-Encoding allows, or
+    None for identity. Quality values only matter as q=0 (refused)."""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(name.strip())
+    for encoding in available:
+        if encoding in accepted or "*" in accepted:
+            return encoding
+    return None
+
+
+class PrecompressedAsset:
+    """A body compressed once with every available encoding, addressed by a
+    content hash for immutable URLs."""
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.encoded: Dict[str, bytes] = {encoding: compress(body, encoding) for encoding in ENCODINGS}
+
+    def etag(self, encoding: Optional[str]) -> str:
+        # Strong ETags have to differ between content codings
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == "*" or tag.strip('"').split("-")[0] == self.digest:
+                return True
+        return False
+
+    def select(self, accept_encoding: Optional[str]):
+        """(encoding or None, body) for a request's Accept-Encoding."""
+        encoding = choose_encoding(accept_encoding, self.encoded)
+        return encoding, self.encoded[encoding] if encoding else self.body
+
+
+# ----------------------
+# Middleware
+# ----------------------
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/css", "text/plain",
+                      "text/html", "application/javascript")
+# Per-response levels; bodies that are cached by ETag get the maximum instead.
+DYNAMIC_LEVELS = {"br": 4, "gzip": 6}
+
+
+class _StreamCompressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=DYNAMIC_LEVELS["br"])
+        else:
+            self._c = zlib.compressobj(DYNAMIC_LEVELS["gzip"], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # Flush every chunk so streamed exports stay incremental for the client
+        if self.encoding == "br":
+            return self._c.process(data) + (self._c.finish() if final else self._c.flush())
+        return self._c.compress(data) + self._c.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli for text responses of at least `minimum_size`
+    bytes; streamed responses are compressed chunk by chunk.
+
+    Responses that carry an ETag are versioned content (palettes and the
+    like), so their compressed bytes are kept in an LRU keyed by
+    (ETag, encoding) and compressed at the maximum level once instead of on
+    every hit. The ETag is weakened on compressed responses, since the bytes
+    differ from the identity representation it names. Responses that already
+    have a Content-Encoding are passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, cache_size: int = 256):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+    def _cached(self, etag: str, encoding: str, body: bytes) -> bytes:
+        key = (etag, encoding)
+        data = self._cache.get(key)
+        if data is None:
+            data = compress(body, encoding)
+            self._cache[key] = data
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return data
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_StreamCompressor] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if "content-encoding" in headers or content_type not in COMPRESSIBLE_TYPES or message["status"] in (204, 304):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows the size
+                    start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(scope=start_message)
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                headers.add_vary_header("Accept-Encoding")
+                headers["Content-Encoding"] = encoding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                if not more_body:
+                    body = self._cached(etag, encoding, body) if etag else compress(body, encoding, DYNAMIC_LEVELS[encoding])
+                    headers["Content-Length"] = str(len(body))
+                    passthrough = True
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                compressor = _StreamCompressor(encoding)
+                await send(start_message)
+            await send({"type": "http.response.body", "body": compressor.compress(body, not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
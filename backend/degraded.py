@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class PreferenceRetryBuffer:
+    """Preference writes accepted while storage is unavailable.
+
+    Bounded and in-process: one pending palette per session (the latest
+    wins), replayed in a single batch upsert once storage answers again.
+    Entries are lost if the worker dies first, which is acceptable for a
+    theme choice the client also keeps locally.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._pending: Dict[str, Tuple[str, datetime]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, palette_ids: Dict[str, str], now: datetime) -> bool:
+        """Buffer session -> palette writes; all or nothing, False when they
+        don't fit."""
+        new = sum(1 for session_id in palette_ids if session_id not in self._pending)
+        if len(self._pending) + new > self.maxsize:
+            return False
+        for session_id, palette_id in palette_ids.items():
+            self._pending[session_id] = (palette_id, now)
+        return True
+
+    def get(self, session_id: str) -> Optional[dict]:
+        entry = self._pending.get(session_id)
+        if entry is None:
+            return None
+        return {"session_id": session_id, "palette_id": entry[0], "updated_at": entry[1]}
+
+    def discard(self, session_id: str):
+        """Drop a pending write superseded by one that reached storage."""
+        self._pending.pop(session_id, None)
+
+    async def replay(self, storage) -> int:
+        if not self._pending:
+            return 0
+        batch = dict(self._pending)
+        # Storage keeps one updated_at per batch; use the newest pending time
+        await storage.upsert_preferences({s: p for s, (p, _) in batch.items()}, max(t for _, t in batch.values()))
+        for session_id, entry in batch.items():
+            # Keep entries rewritten while the replay was in flight
+            if self._pending.get(session_id) == entry:
+                del self._pending[session_id]
+        return len(batch)
+
+
+class NotifySpool:
+    """Append-only JSONL files of notify signups accepted while storage is
+    unavailable, one per worker process under `directory`.
+
+    Each append is fsynced before the request is acknowledged. Replay
+    renames the worker's file first so new signups keep spooling meanwhile;
+    a replay that fails is retried from the renamed file next time. Files
+    left behind by workers that have exited are replayed by whichever
+    worker finds them first. Upserts are idempotent, so replaying a file
+    twice is harmless.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f"notify-{self.pid}.jsonl")
+        self.replay_path = self.path + ".replaying"
+        self._lock = threading.Lock()
+        self._has_pending = bool(self._orphans()) or os.path.exists(self.path) or os.path.exists(self.replay_path)
+
+    def pending(self) -> bool:
+        return self._has_pending
+
+    def _orphans(self) -> List[str]:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        orphans = []
+        for name in names:
+            pid = name[len("notify-"):].split(".", 1)[0]
+            if name.startswith("notify-") and pid.isdigit() and int(pid) != self.pid and not _alive(int(pid)):
+                orphans.append(os.path.join(self.directory, name))
+        return orphans
+
+    def _append(self, data: bytes) -> bool:
+        with self._lock:
+            try:
+                if os.path.getsize(self.path) >= self.max_bytes:
+                    return False
+            except FileNotFoundError:
+                os.makedirs(self.directory, exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._has_pending = True
+        return True
+
+    async def append(self, emails: Dict[str, Tuple[datetime, datetime]]) -> bool:
+        """Spool email -> (first seen, last seen) upserts; False when full."""
+        data = b"".join(
+            json.dumps({"email": email, "first": first.isoformat(), "last": last.isoformat()}).encode() + b"\n"
+            for email, (first, last) in emails.items()
+        )
+        return await asyncio.to_thread(self._append, data)
+
+    def _claim(self) -> Tuple[Dict[str, Tuple[datetime, datetime]], List[str]]:
+        with self._lock:
+            if not os.path.exists(self.replay_path) and os.path.exists(self.path):
+                os.replace(self.path, self.replay_path)
+        paths = [self.replay_path] + self._orphans()
+        emails: Dict[str, Tuple[datetime, datetime]] = {}
+        claimed = []
+        for path in paths:
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            claimed.append(path)
+            with f:
+                for raw in f:
+                    try:
+                        entry = json.loads(raw)
+                        email = entry["email"]
+                        first, last = datetime.fromisoformat(entry["first"]), datetime.fromisoformat(entry["last"])
+                    except (ValueError, KeyError):
+                        # A torn last line from a crash mid-write
+                        logger.warning("Skipping unreadable notify spool line in %s: %r", path, raw[:200])
+                        continue
+                    seen = emails.get(email)
+                    emails[email] = (min(seen[0], first), max(seen[1], last)) if seen else (first, last)
+        return emails, claimed
+
+    def _release(self, claimed: List[str]):
+        for path in claimed:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._has_pending = os.path.exists(self.path)
+
+    async def replay(self, storage) -> int:
+        emails, claimed = await asyncio.to_thread(self._claim)
+        if emails:
+            await storage.upsert_notify_emails(emails)
+        await asyncio.to_thread(self._release, claimed)
+        return len(emails)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,126 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set
+
+import metrics
+
+
+class Subscription:
+    def __init__(self, topics: Iterable[str], max_queue: int):
+        self.topics = tuple(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        # Set when the hub dropped this subscriber for falling behind, or
+        # ended every stream because the worker is shutting down
+        self.overflowed = False
+
+
+class EventHub:
+    """In-process fan-out from the worker's shared watchers to SSE clients.
+
+    Each subscriber has a bounded queue. A subscriber whose queue is full is
+    dropped instead of buffering without limit or stalling the publisher;
+    its stream ends and EventSource reconnects and resyncs.
+    """
+
+    def __init__(self, max_queue: int = 64, max_subscribers: int = 10000):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._topics: Dict[str, Set[Subscription]] = {}
+        # Newest version published per subscribed topic. An update can arrive
+        # both from a local write and from the change stream, possibly out of
+        # order; only versions newer than the last one are sent.
+        self._last: Dict[str, Any] = {}
+        self._count = 0
+        self.closed = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    def full(self) -> bool:
+        return self.closed or self._count >= self.max_subscribers
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def subscribe(self, topics: Iterable[str]) -> Optional[Subscription]:
+        """None when the subscriber limit is reached or the hub is closed."""
+        if self.full():
+            return None
+        sub = Subscription(topics, self.max_queue)
+        for topic in sub.topics:
+            self._topics.setdefault(topic, set()).add(sub)
+        self._count += 1
+        metrics.events_subscribers.inc()
+        return sub
+
+    def close(self):
+        """End every stream and refuse new ones, so a draining worker isn't
+        held open by long-lived connections; clients reconnect elsewhere."""
+        self.closed = True
+        for sub in {sub for subs in self._topics.values() for sub in subs}:
+            sub.overflowed = True
+            try:
+                # Wake the stream; a full queue has a wakeup pending anyway
+                sub.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    def unsubscribe(self, sub: Subscription):
+        removed = False
+        for topic in sub.topics:
+            subs = self._topics.get(topic)
+            if subs and sub in subs:
+                subs.discard(sub)
+                removed = True
+                if not subs:
+                    del self._topics[topic]
+                    self._last.pop(topic, None)
+        if removed:
+            self._count -= 1
+            metrics.events_subscribers.dec()
+
+    def publish(self, topic: str, event: str, data: bytes, version):
+        subs = self._topics.get(topic)
+        if not subs:
+            return
+        last = self._last.get(topic)
+        if last is not None and version <= last:
+            return
+        self._last[topic] = version
+        for sub in list(subs):
+            try:
+                sub.queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                sub.overflowed = True
+                self.unsubscribe(sub)
+                metrics.events_dropped.inc()
+
+
+def format_event(event: str, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+async def sse_stream(hub: EventHub, topics: Iterable[str], initial: Iterable[bytes] = (),
+                     heartbeat: float = 15.0, retry_ms: int = 5000) -> AsyncIterator[bytes]:
+    """Subscribe and encode the events as text/event-stream, with comment
+    heartbeats so idle connections survive proxies and dead clients are
+    noticed. Subscribing here rather than in the route means the finally
+    below always runs for a registered subscriber."""
+    sub = hub.subscribe(topics)
+    if sub is None:
+        return
+    try:
+        yield f"retry: {retry_ms}\n\n".encode()
+        for chunk in initial:
+            yield chunk
+        while True:
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            # A full queue means a wakeup is pending, so this is seen promptly
+            if sub.overflowed:
+                return
+            yield format_event(*item)
+    finally:
+        hub.unsubscribe(sub)
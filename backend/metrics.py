@@ -0,0 +1,391 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------
+# Instruments
+# ----------------------
+# A small Prometheus text-format registry. Pymongo listeners run on Motor's
+# executor threads, so every instrument guards its state with a lock.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, *labels: str, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(c), t[0]) for k, (c, t) in self._values.items()]
+        lines = self.header()
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode()
+
+
+registry = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status.", ["method", "route", "status"]))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ["method", "route"]))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", ["method", "route"]))
+mongo_commands = registry.register(Counter(
+    "mongo_commands_total", "Mongo commands by collection, command and outcome.", ["collection", "command", "outcome"]))
+mongo_latency = registry.register(Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency by collection and command.", ["collection", "command"]))
+mongo_pool_connections = registry.register(Gauge(
+    "mongo_pool_connections", "Open pooled connections per server.", ["address"]))
+mongo_pool_checked_out = registry.register(Gauge(
+    "mongo_pool_checked_out", "Connections currently checked out per server.", ["address"]))
+mongo_pool_wait = registry.register(Counter(
+    "mongo_pool_checkout_failures_total", "Failed connection checkouts per server and reason.", ["address", "reason"]))
+rate_limit_decisions = registry.register(Counter(
+    "rate_limit_decisions_total", "Rate limiter decisions by key class and result.", ["key_class", "result"]))
+storage_circuit_open = registry.register(Gauge(
+    "storage_circuit_open", "1 while the storage circuit breaker is open."))
+storage_failures = registry.register(Counter(
+    "storage_failures_total", "Storage calls that timed out, failed or were short-circuited.", ["operation", "reason"]))
+admission_limit = registry.register(Gauge(
+    "admission_concurrency_limit", "Current adaptive concurrency limit."))
+admission_in_flight = registry.register(Gauge(
+    "admission_in_flight", "Admitted requests in progress by priority class.", ["priority"]))
+admission_rejected = registry.register(Counter(
+    "admission_rejected_total", "Requests shed with 503 by priority class.", ["priority"]))
+events_subscribers = registry.register(Gauge(
+    "events_subscribers", "Open server-sent event streams."))
+events_dropped = registry.register(Counter(
+    "events_dropped_subscribers_total", "Event streams closed because the client fell behind."))
+
+
+# ----------------------
+# Mongo monitoring
+# ----------------------
+# Commands whose first value is not a collection name.
+_NO_COLLECTION = {"getMore", "killCursors", "endSessions", "ping", "hello", "isMaster", "ismaster", "buildInfo", "listCollections"}
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Times every Mongo command by collection and command name."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(event) -> Tuple:
+        return (event.connection_id, event.request_id, event.operation_id)
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = value if isinstance(value, str) and event.command_name not in _NO_COLLECTION else ""
+        if event.command_name == "getMore":
+            collection = event.command.get("collection", "")
+        with self._lock:
+            self._pending[self._key(event)] = collection
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._pending.pop(self._key(event), "")
+        seconds = event.duration_micros / 1e6
+        mongo_commands.inc(collection, event.command_name, outcome)
+        mongo_latency.observe(collection, event.command_name, value=seconds)
+        record_db_call(collection, event.command_name, seconds)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out connections per server."""
+
+    @staticmethod
+    def _addr(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        mongo_pool_connections.set(self._addr(event), value=0)
+        mongo_pool_checked_out.set(self._addr(event), value=0)
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(self._addr(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(self._addr(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_wait.inc(self._addr(event), str(event.reason))
+
+    def connection_checked_out(self, event):
+        mongo_pool_checked_out.inc(self._addr(event))
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec(self._addr(event))
+
+
+def mongo_listeners() -> list:
+    return [CommandTimer(), PoolStats()]
+
+
+# ----------------------
+# Per-request DB accounting
+# ----------------------
+# Motor runs pymongo on executor threads with a copy of the caller's context,
+# so listeners see the contextvar of the request that issued the command.
+class RequestDbStats:
+    __slots__ = ("calls",)
+
+    def __init__(self):
+        self.calls: List[Tuple[str, str, float]] = []
+
+    @property
+    def seconds(self) -> float:
+        return sum(call[2] for call in self.calls)
+
+
+current_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("current_db_stats", default=None)
+
+
+def record_db_call(collection: str, command: str, seconds: float):
+    stats = current_db_stats.get()
+    if stats is not None:
+        stats.calls.append((collection, command, seconds))
+
+
+# ----------------------
+# HTTP middleware
+# ----------------------
+class MetricsMiddleware:
+    """Per-route request count, latency and in-flight gauge.
+
+    Requests are labelled with the matched route template, never the raw
+    path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app, routes_app=None):
+        self.app = app
+        self.routes_app = routes_app
+        self._route_cache: Dict[Tuple[str, str], str] = {}
+
+    def _route_for(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        route = self._route_cache.get(key)
+        if route is None:
+            route = "unmatched"
+            for candidate in getattr(self.routes_app, "routes", ()):
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    route = getattr(candidate, "path", route)
+                    break
+            if len(self._route_cache) < 4096:
+                self._route_cache[key] = route
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = self._route_for(scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec(method, route)
+            http_latency.observe(method, route, value=time.perf_counter() - start)
+            http_requests.inc(method, route, str(status["code"]))
+
+
+class ServerTimingMiddleware:
+    """Counts and times DB round trips per request.
+
+    Emits a Server-Timing header (total DB time and call count, one entry per
+    call up to `max_entries`, and total app time), and logs a structured line
+    when a request exceeds the DB-call or latency budget (0 disables either).
+    """
+
+    def __init__(self, app, emit_header: bool = True, db_call_budget: int = 0,
+                 latency_budget_ms: float = 0, max_entries: int = 10):
+        self.app = app
+        self.emit_header = emit_header
+        self.db_call_budget = db_call_budget
+        self.latency_budget_ms = latency_budget_ms
+        self.max_entries = max_entries
+
+    def _header(self, stats: RequestDbStats, elapsed: float) -> str:
+        parts = [f'db;dur={stats.seconds * 1000:.2f};desc="{len(stats.calls)} calls"']
+        for i, (collection, command, seconds) in enumerate(stats.calls[:self.max_entries], 1):
+            desc = f"{command} {collection}".strip()
+            parts.append(f'db{i};dur={seconds * 1000:.2f};desc="{desc}"')
+        parts.append(f"app;dur={elapsed * 1000:.2f}")
+        return ", ".join(parts)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestDbStats()
+        token = current_db_stats.set(stats)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if self.emit_header:
+                    MutableHeaders(scope=message).append("Server-Timing", self._header(stats, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_db_stats.reset(token)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            over_calls = self.db_call_budget and len(stats.calls) > self.db_call_budget
+            over_latency = self.latency_budget_ms and elapsed_ms > self.latency_budget_ms
+            if over_calls or over_latency:
+                logger.warning(json.dumps({
+                    "event": "request_budget_exceeded",
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status["code"],
+                    "duration_ms": round(elapsed_ms, 2),
+                    "db_calls": len(stats.calls),
+                    "db_ms": round(stats.seconds * 1000, 2),
+                    "commands": [f"{command} {collection}".strip() for collection, command, _ in stats.calls],
+                }))
+
+
+def record_rate_limit(keys: Iterable[Tuple[str, str]], denied_keys: Optional[Iterable[str]]):
+    denied = set(denied_keys or ())
+    for key_class, ident in keys:
+        result = "deny" if f"{key_class}:{ident}" in denied else "allow"
+        rate_limit_decisions.inc(key_class, result)
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+import jwt
+
+
+class PreferenceTokens:
+    """HS256 tokens carrying a session's palette choice.
+
+    A token is a snapshot: it stays valid for `ttl` seconds even if the
+    preference changes elsewhere, so the TTL bounds how stale a token read
+    can be. Storage remains the source of truth for writes and for reads
+    without a (valid) token.
+    """
+
+    algorithm = "HS256"
+
+    def __init__(self, secret: str, ttl: int = 3600):
+        self.secret = secret
+        self.ttl = ttl
+
+    def issue(self, value: dict) -> str:
+        updated_at = value["updated_at"].replace(tzinfo=timezone.utc)
+        now = int(datetime.now(timezone.utc).timestamp())
+        claims = {
+            "sid": value["session_id"],
+            "pid": value["palette_id"],
+            # updated_at in epoch milliseconds
+            "upd": int(updated_at.timestamp() * 1000),
+            "exp": now + self.ttl,
+        }
+        return jwt.encode(claims, self.secret, algorithm=self.algorithm)
+
+    def verify(self, token: str, session_id: str) -> Optional[dict]:
+        """The preference in `token`, or None if it is invalid, expired or
+        issued for a different session."""
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm],
+                                options={"require": ["sid", "pid", "upd", "exp"]})
+        except jwt.InvalidTokenError:
+            return None
+        if claims["sid"] != session_id:
+            return None
+        return {
+            "session_id": session_id,
+            "palette_id": claims["pid"],
+            "updated_at": datetime.fromtimestamp(claims["upd"] / 1000, timezone.utc).replace(tzinfo=None),
+        }
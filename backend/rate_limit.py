@@ -0,0 +1,160 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from storage import StorageUnavailable
+
+
+# ----------------------
+# Quotas
+# ----------------------
+_UNITS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+@dataclass(frozen=True)
+class Quota:
+    limit: int
+    window_seconds: int
+
+    @classmethod
+    def parse(cls, spec: str) -> "Quota":
+        """Parse "N/window", where window is seconds ("5/60") or a unit ("5/min", "100/2h")."""
+        count, _, window = spec.strip().partition("/")
+        window = window.strip().lower() or "60"
+        digits = "".join(ch for ch in window if ch.isdigit())
+        unit = window[len(digits):].strip()
+        if unit and unit not in _UNITS:
+            raise ValueError(f"Unknown rate limit window unit in {spec!r}")
+        seconds = int(digits or 1) * _UNITS.get(unit, 1)
+        quota = cls(limit=int(count), window_seconds=seconds)
+        if quota.limit < 1 or quota.window_seconds < 1:
+            raise ValueError(f"Invalid rate limit quota {spec!r}")
+        return quota
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    retry_after: int = 0
+    denied_keys: Tuple[str, ...] = ()
+
+
+# ----------------------
+# Backends
+# ----------------------
+class RateLimitBackend:
+    async def hit(self, checks: Sequence[Tuple[str, Quota]]) -> Decision:
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    """GCRA per key in an LRU-bounded dict.
+
+    All keys of a request are checked before any is charged, so a denied
+    request consumes nothing. State is per process. Times are integer
+    nanoseconds (`clock` defaults to time.monotonic_ns): with floats, rounding
+    could refuse a key's first hit or the last hit of a full burst.
+    """
+
+    def __init__(self, max_keys: int = 100_000, clock=time.monotonic_ns):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._tat: "OrderedDict[str, int]" = OrderedDict()
+
+    async def hit(self, checks: Sequence[Tuple[str, Quota]]) -> Decision:
+        now = self.clock()
+        updates: List[Tuple[str, int]] = []
+        denied: List[str] = []
+        retry_after = 0
+        for key, quota in checks:
+            window = quota.window_seconds * 1_000_000_000
+            tat = max(self._tat.get(key, now), now)
+            new_tat = tat + window // quota.limit
+            # Allow a burst of `limit` hits inside one window.
+            wait = new_tat - now - window
+            if wait > 0:
+                denied.append(key)
+                retry_after = max(retry_after, wait)
+            else:
+                updates.append((key, new_tat))
+        if denied:
+            return Decision(False, math.ceil(retry_after / 1_000_000_000), tuple(denied))
+        for key, new_tat in updates:
+            self._tat[key] = new_tat
+            self._tat.move_to_end(key)
+        while len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+        return Decision(True)
+
+
+class StorageBackend(RateLimitBackend):
+    """Fixed-window counters kept in the shared storage backend, so limits
+    hold across workers. All keys are counted in one storage call; windows
+    are keyed by their start time and expire at their end. While storage is
+    unavailable, limits are enforced per worker by `fallback` instead.
+
+    Unlike MemoryBackend, a denied request still counts against the keys
+    that passed: every window is incremented in the same round trip that
+    finds out which are full.
+    """
+
+    def __init__(self, storage, fallback: Optional[RateLimitBackend] = None):
+        self.storage = storage
+        self.fallback = fallback
+
+    async def hit(self, checks: Sequence[Tuple[str, Quota]]) -> Decision:
+        epoch = int(time.time())
+        windows = []
+        for key, quota in checks:
+            window_start = epoch - epoch % quota.window_seconds
+            expire_at = datetime.utcfromtimestamp(window_start + quota.window_seconds)
+            windows.append((f"{key}:{window_start}", quota.limit, expire_at))
+        try:
+            allowed = await self.storage.hit_rate_limits(windows)
+        except StorageUnavailable:
+            if self.fallback is None:
+                raise
+            return await self.fallback.hit(checks)
+        denied = [(key, quota) for (key, quota), ok in zip(checks, allowed) if not ok]
+        if not denied:
+            return Decision(True)
+        retry_after = max(quota.window_seconds - epoch % quota.window_seconds for _, quota in denied)
+        return Decision(False, retry_after, tuple(key for key, _ in denied))
+
+
+# ----------------------
+# Limiter
+# ----------------------
+class RateLimiter:
+    """Checks named key classes (e.g. "notify:ip") against configured quotas."""
+
+    def __init__(self, backend: RateLimitBackend, quotas: Dict[str, Quota]):
+        self.backend = backend
+        self.quotas = quotas
+
+    async def hit(self, keys: Sequence[Tuple[str, str]]) -> Decision:
+        """`keys` is a list of (key_class, identifier) pairs checked together."""
+        checks = [(f"{key_class}:{ident}", self.quotas[key_class]) for key_class, ident in keys]
+        return await self.backend.hit(checks)
+
+
+def build_rate_limiter(env, storage, defaults: Dict[str, str]) -> RateLimiter:
+    """Build from env: RATE_LIMIT_BACKEND (memory|storage), RATE_LIMIT_MAX_KEYS and
+    one RATE_LIMIT_<KEY_CLASS> quota per class, e.g. RATE_LIMIT_NOTIFY_IP="5/min".
+    """
+    quotas = {}
+    for key_class, default in defaults.items():
+        env_name = "RATE_LIMIT_" + key_class.upper().replace(":", "_")
+        quotas[key_class] = Quota.parse(env.get(env_name, default))
+
+    kind = env.get("RATE_LIMIT_BACKEND", "memory").lower()
+    if kind == "memory":
+        backend: RateLimitBackend = MemoryBackend(max_keys=int(env.get("RATE_LIMIT_MAX_KEYS", "100000")))
+    elif kind in ("storage", "mongo"):
+        # "mongo" predates pluggable storage and now means the shared store
+        backend = StorageBackend(storage, fallback=MemoryBackend(max_keys=int(env.get("RATE_LIMIT_MAX_KEYS", "100000"))))
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND {kind!r}")
+    return RateLimiter(backend, quotas)
@@ -1,25 +1,56 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Query, Response
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import io
+import base64
+import csv
+import json
+import asyncio
+import hashlib
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional
 import uuid
-from datetime import datetime, timedelta
-from pymongo.errors import DuplicateKeyError
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from rate_limit import build_rate_limiter
+from write_behind import NotifyWriteBehind
+from cache import MISS, SingleFlight, TTLCache, WriteGenerations
+from preference_tokens import PreferenceTokens
+from events import EventHub, format_event, sse_stream
+from compression import CompressionMiddleware, PrecompressedAsset
+from admission import AdaptiveLimiter, AdmissionMiddleware
+from degraded import NotifySpool, PreferenceRetryBuffer
+from storage import CircuitBreaker, InvalidCursor, ResilientStorage, StorageUnavailable, bucket_start, create_storage
+import metrics
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db_name = os.environ.get('DB_NAME', 'app_db')
-db = client[db_name]
+# Storage backend (STORAGE_BACKEND=mongo|memory|sqlite, default mongo). Every
+# call gets a deadline, and after STORAGE_BREAKER_FAILURES consecutive
+# timeouts/connection errors calls fail fast with StorageUnavailable for
+# STORAGE_BREAKER_RESET_SECONDS before a probe is let through again.
+STORAGE_BREAKER_RESET_SECONDS = float(os.environ.get('STORAGE_BREAKER_RESET_SECONDS', '10'))
+storage = ResilientStorage(
+    create_storage(os.environ, event_listeners=metrics.mongo_listeners()),
+    CircuitBreaker(
+        failure_threshold=int(os.environ.get('STORAGE_BREAKER_FAILURES', '5')),
+        reset_timeout=STORAGE_BREAKER_RESET_SECONDS,
+    ),
+    read_timeout=int(os.environ.get('STORAGE_READ_TIMEOUT_MS', '1000')) / 1000,
+    write_timeout=int(os.environ.get('STORAGE_WRITE_TIMEOUT_MS', '2000')) / 1000,
+    slow_timeout=int(os.environ.get('STORAGE_SLOW_TIMEOUT_MS', '10000')) / 1000,
+)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -28,6 +59,32 @@ app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 
+# ----------------------
+# Serialization
+# ----------------------
+# Documents we wrote ourselves are trusted: list endpoints project them to the
+# response fields and encode straight to JSON bytes instead of building and
+# re-validating a model per row. Request bodies are still validated.
+# FAST_SERIALIZATION=0 restores the response_model path.
+FAST_SERIALIZATION = os.environ.get('FAST_SERIALIZATION', '1').lower() in ('1', 'true', 'yes')
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), default=_json_default).encode()
+
+def json_response(items, headers: Optional[dict] = None) -> Response:
+    return Response(content=dumps(items), media_type="application/json", headers=headers)
+
+def project(docs: List[dict], fields: List[str]) -> List[dict]:
+    return [{f: doc.get(f) for f in fields} for doc in docs]
+
+
 # ----------------------
 # Models
 # ----------------------
@@ -39,6 +96,11 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+class StatusStat(BaseModel):
+    client_name: str
+    bucket: datetime
+    count: int
+
 class Palette(BaseModel):
     id: str
     name: str
@@ -57,6 +119,17 @@ class PreferenceOut(BaseModel):
     session_id: str
     palette_id: str
     updated_at: datetime
+    token: Optional[str] = None
+
+class PreferenceBatchGetIn(BaseModel):
+    session_ids: List[str]
+
+class PreferenceBatchGetOut(BaseModel):
+    items: List[PreferenceOut]
+    missing: List[str]
+
+class PreferenceBatchSetIn(BaseModel):
+    items: List[PreferenceIn]
 
 class NotifyIn(BaseModel):
     email: EmailStr
@@ -82,27 +155,413 @@ CURATED_PALETTES: List[Palette] = [
     Palette(id="sand", name="Sand", bg="#FAF7F2", color="#2b2620", baseBg="#000000", baseColor="#ffffff", accent="#B8A07A", subtle="#8B8072"),
 ]
 
-async def ensure_indexes_and_seed():
-    # Indexes
-    await db.preferences.create_index("session_id", unique=True)
-    await db.notify_emails.create_index("email", unique=True)
-    await db.palettes.create_index("id", unique=True)
-    # TTL for rate limits
-    await db.rate_limits.create_index("expireAt", expireAfterSeconds=0)
+# Workers can skip schema management entirely (MANAGE_INDEXES=0) and leave it
+# to `python cli.py migrate` in the deploy pipeline.
+MANAGE_INDEXES = os.environ.get('MANAGE_INDEXES', '1').lower() in ('1', 'true', 'yes')
+
+async def ensure_indexes_and_seed(force: bool = False):
+    """Create indexes/schema and seed palettes, skipping work the backend
+    has already recorded."""
+    await storage.migrate([p.model_dump() for p in CURATED_PALETTES], force)
+
+
+# ----------------------
+# Palette cache
+# ----------------------
+# The palette set is small and effectively static, so it is served from an
+# in-process snapshot that is pre-serialized once per change.
+PALETTE_MAX_AGE = int(os.environ.get('PALETTE_MAX_AGE', '60'))
+PALETTE_REFRESH_SECONDS = int(os.environ.get('PALETTE_REFRESH_SECONDS', '60'))
+
+# CSS custom properties per palette field, as applied by the frontend
+PALETTE_CSS_VARS = [
+    ("--msk-color-base", "baseColor"),
+    ("--msk-bg-base", "baseBg"),
+    ("--msk-color", "color"),
+    ("--msk-bg", "bg"),
+    ("--msk-accent", "accent"),
+    ("--msk-subtle", "subtle"),
+]
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def _palette_css_block(selector: str, palette: dict) -> str:
+    props = "".join(f"  {var}: {palette[field]};\n" for var, field in PALETTE_CSS_VARS)
+    return f"{selector} {{\n{props}}}\n"
+
+def build_palette_css(items: List[dict]):
+    """(bundle, {palette_id: asset}). The bundle scopes each palette to
+    [data-palette="<id>"] and makes the first one the :root default; a
+    per-palette sheet sets :root only."""
+    blocks = [_palette_css_block(":root", items[0])] if items else []
+    blocks += [_palette_css_block(f'[data-palette="{p["id"]}"]', p) for p in items]
+    bundle = PrecompressedAsset("".join(blocks).encode(), "text/css")
+    per_palette = {p["id"]: PrecompressedAsset(_palette_css_block(":root", p).encode(), "text/css") for p in items}
+    return bundle, per_palette
+
+class PaletteCache:
+    def __init__(self):
+        self.version = 0
+        self.items: List[dict] = []
+        self.ids: frozenset = frozenset()
+        self.body = b"[]"
+        self.etag = ""
+        self.css, self.css_by_id = build_palette_css([])
+
+    def load(self, items: List[dict]) -> bool:
+        """Swap in a new snapshot; returns False when the content is unchanged."""
+        body = dumps(items)
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        if etag == self.etag:
+            return False
+        self.items, self.body, self.etag = items, body, etag
+        self.ids = frozenset(item["id"] for item in items)
+        # CSS is compiled and compressed here, once per palette-set change
+        self.css, self.css_by_id = build_palette_css(items)
+        self.version += 1
+        return True
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match or not self.etag:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag == "*" or tag == self.etag:
+                return True
+        return False
+
+    def headers(self) -> dict:
+        return {
+            "ETag": self.etag,
+            "Cache-Control": f"public, max-age={PALETTE_MAX_AGE}, stale-while-revalidate={PALETTE_MAX_AGE * 10}",
+        }
+
+palette_cache = PaletteCache()
+
+# Concurrent refreshes (startup, change stream, refresh loop) share one read
+palette_reads = SingleFlight()
+# Reads still in flight when a change event arrives may come from a secondary
+# that hasn't applied it yet; they must not load over the fresh snapshot
+palette_writes = WriteGenerations()
+
+async def refresh_palette_cache(primary: bool = False):
+    """Reload the snapshot. `primary` (after a change event) starts a new
+    read from the primary instead of joining one in flight."""
+    if primary:
+        palette_reads.forget("palettes")
+        palette_writes.bump("palettes")
+    await palette_reads.do("palettes", lambda: _refresh_palette_cache(primary))
+
+async def _refresh_palette_cache(primary: bool = False):
+    generation = palette_writes.begin("palettes")
+    try:
+        items = await storage.list_palettes(primary)
+    finally:
+        fresh = palette_writes.end("palettes", generation)
+    if fresh and palette_cache.load([Palette(**item).model_dump() for item in items]):
+        logger.info("Palette cache loaded (version %s, %s palettes)", palette_cache.version, len(items))
+        event_hub.publish("palettes", "palettes", palette_cache.body, palette_cache.version)
+
+def _log_refresh_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.error("Palette cache refresh failed: %s", task.exception())
+
+def _on_palette_change(change: dict):
+    # Re-read the whole (tiny) set rather than patching the snapshot in place.
+    asyncio.create_task(refresh_palette_cache(primary=True)).add_done_callback(_log_refresh_failure)
+
+async def _palette_refresh_loop():
+    while True:
+        await asyncio.sleep(PALETTE_REFRESH_SECONDS)
+        try:
+            await refresh_palette_cache()
+        except Exception:
+            logger.exception("Palette cache refresh failed; keeping version %s", palette_cache.version)
+
+_background_tasks: List[asyncio.Task] = []
+
+# Optional write-behind for notify upserts (NOTIFY_WRITE_BEHIND=1)
+NOTIFY_WRITE_BEHIND = os.environ.get('NOTIFY_WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+notify_writer: Optional[NotifyWriteBehind] = None
+
+
+# ----------------------
+# Preference cache
+# ----------------------
+# Read-through LRU keyed by session_id. Other workers' writes arrive through a
+# change stream when the deployment supports one; otherwise entries simply
+# expire after PREFERENCE_CACHE_TTL seconds.
+preference_cache = TTLCache(
+    maxsize=int(os.environ.get('PREFERENCE_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('PREFERENCE_CACHE_TTL', '30')),
+    negative_ttl=float(os.environ.get('PREFERENCE_NEGATIVE_TTL', '5')),
+)
+PREFERENCE_CACHE_INVALIDATION = os.environ.get('PREFERENCE_CACHE_INVALIDATION', 'changestream').lower()
+
+# Concurrent misses for one session share a single storage read
+preference_reads = SingleFlight()
+# Reads still in flight when a write lands must not cache their older result
+preference_writes = WriteGenerations()
+
+def _cache_written_preference(value: dict):
+    session_id = value["session_id"]
+    # Later callers start a fresh read instead of sharing one from before the write
+    preference_reads.forget(session_id)
+    preference_writes.bump(session_id)
+    preference_cache.set(session_id, value)
+
+def _preference_value(doc: dict) -> dict:
+    return {
+        "session_id": doc["session_id"],
+        "palette_id": doc["palette_id"],
+        "updated_at": doc.get("updated_at") or datetime.utcnow(),
+    }
+
+# Signed preference tokens (PREFERENCE_TOKEN_SECRET set): responses carry a
+# token that GET /preferences can verify without touching storage.
+PREFERENCE_TOKEN_SECRET = os.environ.get('PREFERENCE_TOKEN_SECRET')
+preference_tokens = (
+    PreferenceTokens(PREFERENCE_TOKEN_SECRET, ttl=int(os.environ.get('PREFERENCE_TOKEN_TTL', '3600')))
+    if PREFERENCE_TOKEN_SECRET else None
+)
+
+def _preference_out(value: dict) -> PreferenceOut:
+    token = preference_tokens.issue(value) if preference_tokens else None
+    return PreferenceOut(**value, token=token)
+
+def _apply_preference_change(change: dict):
+    doc = change.get("fullDocument")
+    if not doc or "session_id" not in doc:
+        # Deletes only carry _id, so we cannot tell which session went away.
+        _reset_preference_cache()
+        return
+    value = _preference_value(doc)
+    if PREFERENCE_CACHE_INVALIDATION == "changestream":
+        preference_writes.bump(doc["session_id"])
+        # Only refresh sessions this worker already holds, so the LRU is not
+        # flooded with other workers' traffic.
+        if doc["session_id"] in preference_cache:
+            preference_cache.set(doc["session_id"], value)
+    publish_preference(value)
+
+def _reset_preference_cache():
+    if PREFERENCE_CACHE_INVALIDATION == "changestream":
+        preference_writes.bump_all()
+        preference_cache.clear()
+
+
+# ----------------------
+# Live events
+# ----------------------
+# GET /api/events streams palette-set and per-session preference changes.
+# Each worker fans out from the watchers it already runs (one change stream
+# per collection, not per client); local writes are published directly so
+# backends without a change feed still push this worker's own updates.
+EVENTS_ENABLED = os.environ.get('EVENTS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('EVENTS_HEARTBEAT_SECONDS', '15'))
+event_hub = EventHub(
+    max_queue=int(os.environ.get('EVENTS_QUEUE_SIZE', '64')),
+    max_subscribers=int(os.environ.get('EVENTS_MAX_SUBSCRIBERS', '10000')),
+)
+
+def _preference_topic(session_id: str) -> str:
+    return f"preference:{session_id}"
+
+def publish_preference(value: dict):
+    topic = _preference_topic(value["session_id"])
+    if event_hub.has_subscribers(topic):
+        payload = dumps(_preference_out(value).model_dump(mode="json"))
+        event_hub.publish(topic, "preference", payload, value["updated_at"])
+
+
+# ----------------------
+# Degraded mode
+# ----------------------
+# While storage is unavailable the landing page keeps working: palettes are
+# served from the in-memory snapshot (the curated set if storage was already
+# down at startup), preference writes wait in a bounded in-process buffer and
+# notify signups in a local spool file. Both are replayed every
+# DEGRADED_REPLAY_SECONDS once storage answers again. Anything else fails
+# fast with a 503.
+DEGRADED_REPLAY_SECONDS = float(os.environ.get('DEGRADED_REPLAY_SECONDS', '5'))
+preference_retry = PreferenceRetryBuffer(maxsize=int(os.environ.get('PREFERENCE_RETRY_BUFFER_SIZE', '10000')))
+notify_spool = NotifySpool(
+    os.environ.get('NOTIFY_SPOOL_DIR', str(ROOT_DIR / 'spool')),
+    max_bytes=int(os.environ.get('NOTIFY_SPOOL_MAX_BYTES', str(64 * 1024 * 1024))),
+)
+
+@app.exception_handler(StorageUnavailable)
+async def storage_unavailable(request: Request, exc: StorageUnavailable):
+    logger.warning("%s %s: %s", request.method, request.url.path, exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Storage temporarily unavailable"},
+        headers={"Retry-After": str(max(1, round(STORAGE_BREAKER_RESET_SECONDS)))},
+    )
+
+def _load_curated_palettes():
+    if palette_cache.load([p.model_dump() for p in CURATED_PALETTES]):
+        logger.warning("Serving the curated palette set until storage is reachable")
+
+async def spool_notify(emails: dict):
+    if not await notify_spool.append(emails):
+        raise StorageUnavailable("notify spool is full")
+
+async def _spool_failed_notify_batch(emails: dict, exc: Exception):
+    # Only outages are spooled; a batch storage rejected would fail again on replay
+    if not isinstance(exc, StorageUnavailable):
+        raise exc
+    await spool_notify(emails)
+
+async def replay_degraded_writes():
+    if len(preference_retry):
+        logger.info("Replayed %d buffered preference writes", await preference_retry.replay(storage))
+    if notify_spool.pending():
+        logger.info("Replayed %d spooled notify signups", await notify_spool.replay(storage))
+
+async def _degraded_replay_loop():
+    while True:
+        await asyncio.sleep(DEGRADED_REPLAY_SECONDS)
+        try:
+            await replay_degraded_writes()
+        except StorageUnavailable:
+            pass
+        except Exception:
+            logger.exception("Replaying degraded-mode writes failed")
 
-    # Seed palettes if empty
-    count = await db.palettes.count_documents({})
-    if count == 0:
-        docs = [
-            {"_id": p.id, **p.model_dump()} for p in CURATED_PALETTES
-        ]
-        await db.palettes.insert_many(docs)
-        logger.info("Seeded curated palettes")
+
+# ----------------------
+# Warm-up and health
+# ----------------------
+# Nothing is served until startup has finished, so the palette snapshot (and
+# its precompressed CSS) is already loaded by then; warm-up also opens
+# STORAGE_WARM_CONNECTIONS pooled connections so the first requests after a
+# deploy don't pay for connection setup.
+STORAGE_WARM_CONNECTIONS = int(os.environ.get('STORAGE_WARM_CONNECTIONS', '10'))
+# An unreachable store normally only shows up in the /readyz body: degraded
+# mode still serves the landing page, and failing readiness on every worker at
+# once would take it down entirely. READY_REQUIRES_STORAGE=1 fails it instead.
+READY_REQUIRES_STORAGE = os.environ.get('READY_REQUIRES_STORAGE', '0').lower() in ('1', 'true', 'yes')
+_ready = False
+_draining = False
+
+async def prewarm():
+    # Concurrent pings make the pool open that many connections
+    await asyncio.gather(*(storage.ping() for _ in range(STORAGE_WARM_CONNECTIONS)))
+
+def begin_drain():
+    """Called by `cli.py serve` on SIGTERM while the worker keeps serving:
+    fail readiness so the load balancer stops routing here, and end event
+    streams so they don't hold the drain open."""
+    global _draining
+    _draining = True
+    event_hub.close()
+    logger.info("Draining: readiness now failing")
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    try:
+        await storage.ping()
+        storage_state = "ok"
+    except StorageUnavailable:
+        storage_state = "unavailable"
+    if _draining:
+        status = "draining"
+    elif not _ready:
+        status = "starting"
+    elif storage_state != "ok" and READY_REQUIRES_STORAGE:
+        status = "unavailable"
+    else:
+        status = "ready"
+    return JSONResponse(status_code=200 if status == "ready" else 503, content={"status": status, "storage": storage_state})
 
 
 @app.on_event("startup")
 async def startup_tasks():
-    await ensure_indexes_and_seed()
+    global _ready, notify_writer
+    try:
+        if MANAGE_INDEXES:
+            await ensure_indexes_and_seed()
+        await refresh_palette_cache()
+    except StorageUnavailable:
+        logger.exception("Storage unavailable at startup")
+        _load_curated_palettes()
+    try:
+        await prewarm()
+    except StorageUnavailable as exc:
+        logger.warning("Connection warm-up failed: %s", exc)
+    if DEGRADED_REPLAY_SECONDS > 0:
+        _background_tasks.append(asyncio.create_task(_degraded_replay_loop()))
+    if PALETTE_REFRESH_SECONDS > 0:
+        _background_tasks.append(asyncio.create_task(_palette_refresh_loop()))
+    _background_tasks.append(asyncio.create_task(
+        storage.watch("palettes", _on_palette_change, lambda: None)
+    ))
+    if PREFERENCE_CACHE_INVALIDATION == "changestream" or EVENTS_ENABLED:
+        _background_tasks.append(asyncio.create_task(
+            storage.watch("preferences", _apply_preference_change, _reset_preference_cache)
+        ))
+    if NOTIFY_WRITE_BEHIND:
+        notify_writer = NotifyWriteBehind(
+            storage,
+            max_queue=int(os.environ.get('NOTIFY_QUEUE_SIZE', '10000')),
+            batch_size=int(os.environ.get('NOTIFY_BATCH_SIZE', '500')),
+            flush_interval=int(os.environ.get('NOTIFY_FLUSH_INTERVAL_MS', '200')) / 1000,
+            put_timeout=int(os.environ.get('NOTIFY_QUEUE_TIMEOUT_MS', '1000')) / 1000,
+            on_failure=_spool_failed_notify_batch,
+        )
+        notify_writer.start()
+    _ready = True
+
+
+# ----------------------
+# Status rollups
+# ----------------------
+# Every inserted check bumps a per-client minute and hour bucket in
+# status_rollups, so stats reads never scan raw checks. Rollup writes are
+# best-effort; `python cli.py backfill-rollups` recomputes buckets from the
+# raw collection.
+ROLLUP_GRANULARITIES = ("minute", "hour")
+ROLLUP_MINUTE_RETENTION_SECONDS = int(os.environ.get('ROLLUP_MINUTE_RETENTION_SECONDS', str(7 * 86400)))
+STATS_MAX_BUCKETS = 10000
+
+def _rollup_expiry(granularity: str, bucket: datetime) -> Optional[datetime]:
+    if granularity == "minute" and ROLLUP_MINUTE_RETENTION_SECONDS > 0:
+        return bucket + timedelta(seconds=ROLLUP_MINUTE_RETENTION_SECONDS)
+    return None
+
+async def record_status_rollups(docs: List[dict]):
+    counts = Counter(
+        (granularity, doc["client_name"], bucket_start(doc["timestamp"], granularity))
+        for doc in docs
+        for granularity in ROLLUP_GRANULARITIES
+    )
+    increments = [
+        (granularity, client_name, bucket, n, _rollup_expiry(granularity, bucket))
+        for (granularity, client_name, bucket), n in counts.items()
+    ]
+    try:
+        await storage.increment_status_rollups(increments)
+    except Exception:
+        logger.exception("Status rollup update failed for %d checks", len(docs))
+
+async def backfill_status_rollups(since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """Recompute rollup buckets from raw checks.
+
+    Backends rewrite whole buckets, so the range is widened to hour
+    boundaries (which are minute boundaries too); a bucket cut by the range
+    would otherwise be overwritten with only part of its count.
+    """
+    if since is not None:
+        since = bucket_start(since, "hour")
+    if until is not None and until != bucket_start(until, "hour"):
+        until = bucket_start(until, "hour") + timedelta(hours=1)
+    await storage.backfill_status_rollups(since, until, ROLLUP_MINUTE_RETENTION_SECONDS)
 
 
 # ----------------------
@@ -116,45 +575,289 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    status_doc = status_obj.dict()
+    await storage.insert_status_checks([status_doc])
+    # Only count checks that were stored; a failed insert is retried by the
+    # client and would otherwise be counted twice.
+    await record_status_rollups([status_doc])
     return status_obj
 
+STATUS_FIELDS = ["id", "client_name", "timestamp"]
+STATUS_PAGE_MAX = 1000
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored timestamps are naive UTC; accept aware query values too.
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _encode_status_cursor(doc: dict) -> str:
+    raw = f"{doc['timestamp'].isoformat()}|{doc['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_status_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, _, status_id = raw.partition("|")
+        return datetime.fromisoformat(ts), status_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+STATUS_BATCH_MAX = int(os.environ.get('STATUS_BATCH_MAX', '1000'))
+
+@api_router.post("/status/batch", response_model=List[StatusCheck])
+async def create_status_checks(items: List[StatusCheckCreate]):
+    if len(items) > STATUS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {STATUS_BATCH_MAX} status checks per batch")
+    status_objs = [StatusCheck(**item.dict()) for item in items]
+    if not status_objs:
+        return []
+    docs = [status_obj.dict() for status_obj in status_objs]
+    await storage.insert_status_checks(docs)
+    await record_status_rollups(docs)
+    if FAST_SERIALIZATION:
+        return json_response(project(docs, STATUS_FIELDS))
+    return status_objs
+
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
+async def get_status_checks(
+    response: Response,
+    since: Optional[datetime] = Query(None, description="Only checks at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only checks before this time"),
+    client_name: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=STATUS_PAGE_MAX),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+):
+    cursor = _decode_status_cursor(after) if after else None
+    status_checks = await storage.find_status_checks(
+        client_name, _naive_utc(since), _naive_utc(until), cursor, order == "desc", limit + 1,
+    )
+    headers = {}
+    if len(status_checks) > limit:
+        status_checks = status_checks[:limit]
+        headers["X-Next-Cursor"] = _encode_status_cursor(status_checks[-1])
+    if FAST_SERIALIZATION:
+        return json_response(project(status_checks, STATUS_FIELDS), headers=headers)
+    response.headers.update(headers)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
 
+@api_router.get("/status/stats", response_model=List[StatusStat])
+async def get_status_stats(
+    granularity: str = Query("minute", pattern="^(minute|hour)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    client_name: Optional[str] = None,
+    source: str = Query("rollup", pattern="^(rollup|raw)$", description="raw aggregates status_checks directly"),
+    limit: int = Query(1000, ge=1, le=STATS_MAX_BUCKETS),
+):
+    # raw aggregates status_checks directly, e.g. to verify rollups
+    read = storage.aggregate_status_stats if source == "raw" else storage.find_status_rollups
+    stats = await read(granularity, client_name, _naive_utc(since), _naive_utc(until), limit)
+    if FAST_SERIALIZATION:
+        return json_response(project(stats, ["client_name", "bucket", "count"]))
+    return [StatusStat(**stat) for stat in stats]
+
+
 # ----------------------
 # New/Updated Routes
 # ----------------------
 @api_router.get("/palettes", response_model=List[Palette])
-async def get_palettes():
-    items = await db.palettes.find({}, {"_id": 0}).to_list(1000)
-    return [Palette(**item) for item in items]
+async def get_palettes(request: Request):
+    headers = palette_cache.headers()
+    if palette_cache.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=palette_cache.body, media_type="application/json", headers=headers)
+
+def _asset_response(request: Request, asset: PrecompressedAsset, cache_control: str, location: str) -> Response:
+    encoding, body = asset.select(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": asset.etag(encoding),
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+        # The content-hash URL for this exact body
+        "Content-Location": location,
+    }
+    if asset.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=asset.media_type, headers=headers)
+
+def _palette_css(palette_id: Optional[str]) -> tuple:
+    """(asset, content-hash URL) for the bundle or one palette."""
+    if palette_id is None:
+        asset = palette_cache.css
+        return asset, f"/api/palettes.{asset.digest}.css"
+    asset = palette_cache.css_by_id.get(palette_id)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Palette not found")
+    return asset, f"/api/palettes/{palette_id}.{asset.digest}.css"
+
+# Unversioned URLs revalidate like /palettes; hashed URLs (Content-Location)
+# never change and are cached for a year. A hash from an older palette set
+# redirects to the current one.
+def _palette_css_response(request: Request, palette_id: Optional[str], digest: Optional[str]) -> Response:
+    asset, location = _palette_css(palette_id)
+    if digest is None:
+        return _asset_response(request, asset, palette_cache.headers()["Cache-Control"], location)
+    if digest != asset.digest:
+        return RedirectResponse(location, status_code=302, headers={"Cache-Control": "no-cache"})
+    return _asset_response(request, asset, IMMUTABLE_CACHE_CONTROL, location)
+
+@api_router.get("/palettes.css", include_in_schema=False)
+async def get_palettes_css(request: Request):
+    return _palette_css_response(request, None, None)
+
+@api_router.get("/palettes.{digest}.css", include_in_schema=False)
+async def get_palettes_css_hashed(request: Request, digest: str):
+    return _palette_css_response(request, None, digest)
+
+# The hashed route goes first: "{palette_id}.css" would also match "<id>.<hash>.css"
+@api_router.get("/palettes/{palette_id}.{digest}.css", include_in_schema=False)
+async def get_palette_css_hashed(request: Request, palette_id: str, digest: str):
+    return _palette_css_response(request, palette_id, digest)
+
+@api_router.get("/palettes/{palette_id}.css", include_in_schema=False)
+async def get_palette_css(request: Request, palette_id: str):
+    return _palette_css_response(request, palette_id, None)
 
 @api_router.post("/preferences", response_model=PreferenceOut)
-async def save_preference(body: PreferenceIn):
-    # Validate palette exists
-    palette = await db.palettes.find_one({"id": body.palette_id})
-    if not palette:
+async def save_preference(body: PreferenceIn, response: Response):
+    # Validate palette exists against the in-memory palette set
+    if body.palette_id not in palette_cache.ids:
         raise HTTPException(status_code=404, detail="Palette not found")
 
     session_id = body.session_id or str(uuid.uuid4())
     now = datetime.utcnow()
-    await db.preferences.update_one(
-        {"session_id": session_id},
-        {"$set": {"session_id": session_id, "palette_id": body.palette_id, "updated_at": now}},
-        upsert=True,
-    )
-    return PreferenceOut(session_id=session_id, palette_id=body.palette_id, updated_at=now)
+    try:
+        stored = await storage.upsert_preference(session_id, body.palette_id, now)
+    except StorageUnavailable:
+        # Accepted, and written once storage is back
+        if not preference_retry.add({session_id: body.palette_id}, now):
+            raise
+        response.status_code = 202
+        stored = {"session_id": session_id, "palette_id": body.palette_id, "updated_at": now}
+    else:
+        preference_retry.discard(session_id)
+    value = _preference_value(stored)
+    _cache_written_preference(value)
+    publish_preference(value)
+    return _preference_out(value)
+
+async def _fetch_preference(session_id: str) -> Optional[dict]:
+    generation = preference_writes.begin(session_id)
+    try:
+        pref = await storage.get_preference(session_id)
+    finally:
+        fresh = preference_writes.end(session_id, generation)
+    value = _preference_value(pref) if pref is not None else None
+    if fresh:
+        if value is None:
+            preference_cache.set_missing(session_id)
+        else:
+            preference_cache.set(session_id, value)
+    return value
 
 @api_router.get("/preferences", response_model=PreferenceOut)
-async def load_preference(session_id: str = Query(...)):
-    pref = await db.preferences.find_one({"session_id": session_id})
-    if not pref:
+async def load_preference(
+    session_id: str = Query(...),
+    token: Optional[str] = Query(None, description="Token from a previous response; skips the lookup while valid"),
+):
+    if token and preference_tokens:
+        value = preference_tokens.verify(token, session_id)
+        if value is not None:
+            # Hand the same token back rather than minting one per read
+            return PreferenceOut(**value, token=token)
+    # A write still waiting for storage is newer than anything stored
+    value = preference_retry.get(session_id) or preference_cache.get(session_id)
+    if value is MISS:
+        value = await preference_reads.do(session_id, lambda: _fetch_preference(session_id))
+    if value is None:
         raise HTTPException(status_code=404, detail="Preference not found")
-    return PreferenceOut(session_id=pref["session_id"], palette_id=pref["palette_id"], updated_at=pref.get("updated_at", datetime.utcnow()))
+    return _preference_out(value)
+
+# Batch endpoints for server-side renderers and jobs: one storage round trip
+# per request instead of one per session.
+PREFERENCE_BATCH_MAX = int(os.environ.get('PREFERENCE_BATCH_MAX', '500'))
+
+def _check_preference_batch(size: int):
+    if size > PREFERENCE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {PREFERENCE_BATCH_MAX} preferences per batch")
+
+@api_router.post("/preferences/batch-get", response_model=PreferenceBatchGetOut)
+async def load_preferences(body: PreferenceBatchGetIn):
+    _check_preference_batch(len(body.session_ids))
+    values = {}
+    misses = []
+    for session_id in dict.fromkeys(body.session_ids):
+        value = preference_retry.get(session_id) or preference_cache.get(session_id)
+        if value is MISS:
+            misses.append(session_id)
+        elif value is not None:
+            values[session_id] = value
+    if misses:
+        generations = [preference_writes.begin(session_id) for session_id in misses]
+        try:
+            found = await storage.get_preferences(misses)
+        finally:
+            fresh = {s for s, g in zip(misses, generations) if preference_writes.end(s, g)}
+        for pref in found:
+            values[pref["session_id"]] = _preference_value(pref)
+        for session_id in fresh:
+            if session_id in values:
+                preference_cache.set(session_id, values[session_id])
+            else:
+                preference_cache.set_missing(session_id)
+    return PreferenceBatchGetOut(
+        items=[_preference_out(values[s]) for s in body.session_ids if s in values],
+        missing=[s for s in body.session_ids if s not in values],
+    )
+
+@api_router.post("/preferences/batch-set", response_model=List[PreferenceOut])
+async def save_preferences(body: PreferenceBatchSetIn, response: Response):
+    _check_preference_batch(len(body.items))
+    unknown = sorted({item.palette_id for item in body.items} - palette_cache.ids)
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Palette not found: {', '.join(unknown)}")
+
+    now = datetime.utcnow()
+    session_ids = [item.session_id or str(uuid.uuid4()) for item in body.items]
+    # A session listed twice keeps its last palette
+    palette_ids = dict(zip(session_ids, (item.palette_id for item in body.items)))
+    if palette_ids:
+        try:
+            await storage.upsert_preferences(palette_ids, now)
+        except StorageUnavailable:
+            if not preference_retry.add(palette_ids, now):
+                raise
+            response.status_code = 202
+        else:
+            for session_id in palette_ids:
+                preference_retry.discard(session_id)
+    values = {}
+    for session_id, palette_id in palette_ids.items():
+        values[session_id] = {"session_id": session_id, "palette_id": palette_id, "updated_at": now}
+        _cache_written_preference(values[session_id])
+        publish_preference(values[session_id])
+    return [_preference_out(values[s]) for s in session_ids]
+
+@api_router.get("/events")
+async def stream_events(session_id: Optional[str] = Query(None, description="Also push this session's preference changes")):
+    if not EVENTS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if event_hub.full():
+        raise HTTPException(status_code=503, detail="Too many event streams", headers={"Retry-After": "30"})
+    topics = ["palettes"] + ([_preference_topic(session_id)] if session_id else [])
+    # The current palette set goes first so clients need no separate fetch
+    initial = [format_event("palettes", palette_cache.body)]
+    return StreamingResponse(
+        sse_stream(event_hub, topics, initial, heartbeat=EVENTS_HEARTBEAT_SECONDS),
+        media_type="text/event-stream",
+        # X-Accel-Buffering stops nginx-style proxies from holding events back
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 def _client_ip(request: Request) -> str:
@@ -165,44 +868,136 @@ def _client_ip(request: Request) -> str:
         return xff.split(",")[0].strip()
     return request.client.host if request.client else "unknown"
 
-async def _rate_limit(key: str, window_seconds: int = 60):
-    now = datetime.utcnow()
-    expire_at = now + timedelta(seconds=window_seconds)
-    try:
-        await db.rate_limits.insert_one({"_id": key, "expireAt": expire_at})
-        return True
-    except DuplicateKeyError:
-        return False
+# Quotas per key class, overridable with RATE_LIMIT_<CLASS> (e.g. RATE_LIMIT_NOTIFY_IP="5/min")
+RATE_LIMIT_DEFAULTS = {
+    "notify:email": "1/min",
+    "notify:ip": "1/min",
+}
+rate_limiter = build_rate_limiter(os.environ, storage, RATE_LIMIT_DEFAULTS)
 
 @api_router.post("/notify")
-async def notify(body: NotifyIn, request: Request):
-    # Rate limit: 1/min per IP and per email
+async def notify(body: NotifyIn, request: Request, response: Response):
+    # Rate limit per IP and per email, checked together in one call
     ip = _client_ip(request)
-    email_key = f"notify:email:{body.email.lower()}"
-    ip_key = f"notify:ip:{ip}"
-
-    ok_email = await _rate_limit(email_key, 60)
-    ok_ip = await _rate_limit(ip_key, 60)
-    if not (ok_email and ok_ip):
-        raise HTTPException(status_code=429, detail="Too many requests. Please try again in a minute.")
+    keys = [("notify:email", body.email.lower()), ("notify:ip", ip)]
+    decision = await rate_limiter.hit(keys)
+    metrics.record_rate_limit(keys, decision.denied_keys)
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please try again in a minute.",
+            headers={"Retry-After": str(max(decision.retry_after, 1))},
+        )
 
     now = datetime.utcnow()
-    await db.notify_emails.update_one(
-        {"email": body.email},
-        {"$setOnInsert": {"created_at": now}, "$set": {"updated_at": now}},
-        upsert=True,
-    )
+    # Write-behind accepts into the queue; a full queue falls back to an inline upsert.
+    if notify_writer and await notify_writer.submit(body.email, now):
+        return {"status": "ok"}
+    try:
+        await storage.upsert_notify_email(body.email, now)
+    except StorageUnavailable:
+        # Durable in the local spool; replayed once storage is back
+        await spool_notify({body.email: (now, now)})
+        response.status_code = 202
     return {"status": "ok"}
 
+ADMIN_EMAILS_PAGE_MAX = 10000
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+EMAIL_FIELDS = ["email", "created_at", "updated_at"]
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+async def _stream_emails(batches, fmt: str):
+    # Batches are pulled from storage and encoded one at a time, so memory
+    # stays flat regardless of collection size.
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EMAIL_FIELDS)
+        yield buf.getvalue().encode()
+    async for batch in batches:
+        yield _encode_email_batch(batch, fmt)
+
+def _encode_email_batch(batch: List[dict], fmt: str) -> bytes:
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for doc in batch:
+            writer.writerow([_export_value(doc.get(f)) or "" for f in EMAIL_FIELDS])
+        return buf.getvalue().encode()
+    return b"".join(dumps({f: doc.get(f) for f in EMAIL_FIELDS}) + b"\n" for doc in batch)
+
 @api_router.get("/admin/emails", response_model=List[EmailOut])
-async def admin_list_emails():
-    items = await db.notify_emails.find({}, {"_id": 0}).to_list(10000)
+async def admin_list_emails(
+    response: Response,
+    limit: int = Query(1000, ge=1, le=ADMIN_EMAILS_PAGE_MAX),
+    after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Stream the full export instead of a page"),
+):
+    try:
+        if format:
+            batches = storage.iter_notify_emails(after, EXPORT_BATCH_SIZE)
+        else:
+            # Keyset pagination: each page starts after the cursor of the previous one.
+            items, next_cursor = await storage.page_notify_emails(after, limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if format:
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            _stream_emails(batches, format),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="emails.{format}"'},
+        )
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if FAST_SERIALIZATION:
+        return json_response(project(items, EMAIL_FIELDS), headers=headers)
+    response.headers.update(headers)
     return [EmailOut(**item) for item in items]
 
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Scraped directly from the pod, so it lives outside the /api prefix.
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+# Innermost, so request metrics and Server-Timing include compression time
+if os.environ.get('COMPRESSION', '1').lower() in ('1', 'true', 'yes'):
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', '1024')),
+        cache_size=int(os.environ.get('COMPRESSION_CACHE_SIZE', '256')),
+    )
+# Load shedding: cached reads and long-lived streams are never limited, bulk
+# routes get a smaller share of the adaptive limit than everything else.
+if os.environ.get('ADMISSION_CONTROL', '1').lower() in ('1', 'true', 'yes'):
+    app.add_middleware(
+        AdmissionMiddleware,
+        limiter=AdaptiveLimiter(
+            initial=int(os.environ.get('ADMISSION_INITIAL_LIMIT', '100')),
+            min_limit=int(os.environ.get('ADMISSION_MIN_LIMIT', '10')),
+            max_limit=int(os.environ.get('ADMISSION_MAX_LIMIT', '1000')),
+            target_latency=float(os.environ.get('ADMISSION_TARGET_DB_MS', '100')) / 1000,
+            bulk_share=float(os.environ.get('ADMISSION_BULK_SHARE', '0.5')),
+            max_queue=int(os.environ.get('ADMISSION_QUEUE_SIZE', '100')),
+            max_wait=float(os.environ.get('ADMISSION_MAX_WAIT_MS', '100')) / 1000,
+        ),
+        exempt=["/api/palettes", "/api/events", "/metrics", "/healthz", "/readyz"],
+        bulk=["/api/notify", "/api/admin/", "/api/status/batch", "/api/preferences/batch-"],
+    )
+app.add_middleware(metrics.MetricsMiddleware, routes_app=app)
+app.add_middleware(
+    metrics.ServerTimingMiddleware,
+    emit_header=os.environ.get('SERVER_TIMING', '1').lower() in ('1', 'true', 'yes'),
+    db_call_budget=int(os.environ.get('DB_CALL_BUDGET', '0')),
+    latency_budget_ms=float(os.environ.get('LATENCY_BUDGET_MS', '0')),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -220,4 +1015,14 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    for task in _background_tasks:
+        task.cancel()
+    if notify_writer:
+        await notify_writer.close()
+    try:
+        await replay_degraded_writes()
+    except StorageUnavailable:
+        # The notify spool survives restarts; buffered preferences do not
+        if len(preference_retry):
+            logger.error("Dropping %d buffered preference writes on shutdown", len(preference_retry))
+    await storage.close()
\ No newline at end of file
@@ -0,0 +1,23 @@
+from .base import InvalidCursor, RateWindow, RollupIncrement, Storage, StorageUnavailable, bucket_start
+from .resilient import CircuitBreaker, ResilientStorage
+
+
+def create_storage(env, **mongo_options) -> Storage:
+    """Pick the backend from STORAGE_BACKEND: mongo (default), memory or sqlite."""
+    kind = env.get("STORAGE_BACKEND", "mongo").lower()
+    if kind == "mongo":
+        from .mongo import MongoStorage
+        return MongoStorage.from_env(env, **mongo_options)
+    if kind == "memory":
+        from .memory import MemoryStorage
+        return MemoryStorage()
+    if kind == "sqlite":
+        from .sqlite import SqliteStorage
+        return SqliteStorage(env.get("SQLITE_PATH", "app.db"))
+    raise ValueError(f"Unknown STORAGE_BACKEND {kind!r}")
+
+
+__all__ = [
+    "CircuitBreaker", "InvalidCursor", "RateWindow", "ResilientStorage", "RollupIncrement", "Storage",
+    "StorageUnavailable", "bucket_start", "create_storage",
+]
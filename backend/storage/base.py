@@ -0,0 +1,135 @@
+import contextlib
+from datetime import datetime
+from typing import AsyncIterator, Callable, ContextManager, Dict, List, Optional, Tuple
+
+
+# (granularity, client_name, bucket start, count to add, expire_at or None)
+RollupIncrement = Tuple[str, str, datetime, int, Optional[datetime]]
+# (window key, limit, window end)
+RateWindow = Tuple[str, int, datetime]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class StorageUnavailable(Exception):
+    """The backend timed out or is failing; raised instead of waiting on it."""
+
+
+class Storage:
+    """Persistence for every collection the API touches.
+
+    Datetimes are naive UTC throughout. Documents are plain dicts shaped like
+    the response models (no `_id`), so routes never see backend specifics.
+    """
+
+    name = "base"
+    # Errors that mean the backend is unreachable or overloaded (as opposed to
+    # a bad request); they count towards opening the circuit breaker.
+    transient_errors: tuple = ()
+
+    # -- lifecycle --
+    async def migrate(self, palettes: List[dict], force: bool = False):
+        """Create schema/indexes and seed `palettes` into an empty palette set."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def ping(self):
+        """One cheap round trip; raises if the backend cannot be reached."""
+        return None
+
+    def deadline(self, seconds: Optional[float]) -> ContextManager:
+        """Bound the backend's own work for calls made inside the block.
+
+        ResilientStorage stops waiting after `seconds` either way; backends
+        that can also abort the operation itself (rather than leave it
+        holding a connection) override this.
+        """
+        return contextlib.nullcontext()
+
+    async def watch(self, collection: str, apply: Callable[[dict], None], on_reset: Callable[[], None]):
+        """Feed cross-process change events for `collection` to `apply`.
+
+        Only backends shared between processes have such a feed; the default
+        returns immediately and callers rely on TTL expiry.
+        """
+        return None
+
+    # -- palettes --
+    async def list_palettes(self, primary: bool = False) -> List[dict]:
+        """All palettes. `primary` asks backends that read from replicas for
+        an up-to-date read instead."""
+        raise NotImplementedError
+
+    # -- preferences --
+    async def get_preference(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def upsert_preference(self, session_id: str, palette_id: str, now: datetime) -> dict:
+        """Upsert and return the stored preference."""
+        raise NotImplementedError
+
+    async def get_preferences(self, session_ids: List[str]) -> List[dict]:
+        """Stored preferences for any of `session_ids`, in no particular order."""
+        raise NotImplementedError
+
+    async def upsert_preferences(self, palette_ids: Dict[str, str], now: datetime):
+        """Upsert many preferences (session_id -> palette_id) in one round trip."""
+        raise NotImplementedError
+
+    # -- notify emails --
+    async def upsert_notify_email(self, email: str, now: datetime):
+        await self.upsert_notify_emails({email: (now, now)})
+
+    async def upsert_notify_emails(self, emails: Dict[str, Tuple[datetime, datetime]]):
+        """Upsert many emails; values are (created_at if new, updated_at)."""
+        raise NotImplementedError
+
+    async def page_notify_emails(self, after: Optional[str], limit: int) -> Tuple[List[dict], Optional[str]]:
+        """One page in insertion order plus the cursor of the next page, if any.
+        Raises InvalidCursor for a malformed `after`."""
+        raise NotImplementedError
+
+    def iter_notify_emails(self, after: Optional[str], batch_size: int) -> AsyncIterator[List[dict]]:
+        """All emails after `after` in insertion order, in batches. Raises
+        InvalidCursor on the call, before iteration starts."""
+        raise NotImplementedError
+
+    # -- status checks --
+    async def insert_status_checks(self, docs: List[dict]):
+        raise NotImplementedError
+
+    async def find_status_checks(self, client_name: Optional[str], since: Optional[datetime], until: Optional[datetime],
+                                 after: Optional[Tuple[datetime, str]], descending: bool, limit: int) -> List[dict]:
+        """Checks ordered by (timestamp, id), starting after the `after` key."""
+        raise NotImplementedError
+
+    async def increment_status_rollups(self, increments: List[RollupIncrement]):
+        raise NotImplementedError
+
+    async def find_status_rollups(self, granularity: str, client_name: Optional[str], since: Optional[datetime],
+                                  until: Optional[datetime], limit: int) -> List[dict]:
+        raise NotImplementedError
+
+    async def aggregate_status_stats(self, granularity: str, client_name: Optional[str], since: Optional[datetime],
+                                     until: Optional[datetime], limit: int) -> List[dict]:
+        """Same shape as find_status_rollups, computed from raw checks."""
+        raise NotImplementedError
+
+    async def backfill_status_rollups(self, since: Optional[datetime], until: Optional[datetime],
+                                      minute_retention_seconds: int):
+        raise NotImplementedError
+
+    # -- rate limits --
+    async def hit_rate_limits(self, windows: List[RateWindow]) -> List[bool]:
+        """Count one hit in each fixed window; True where it was within the limit."""
+        raise NotImplementedError
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
@@ -0,0 +1,146 @@
+import itertools
+from collections import Counter
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from .base import InvalidCursor, RateWindow, RollupIncrement, Storage, bucket_start
+
+
+def _in_range(value: datetime, since: Optional[datetime], until: Optional[datetime]) -> bool:
+    return (since is None or value >= since) and (until is None or value < until)
+
+
+class MemoryStorage(Storage):
+    """Process-local dicts. Nothing is persisted or shared between workers;
+    meant for tests, benchmarks that isolate framework overhead, and
+    single-process edge nodes."""
+
+    name = "memory"
+
+    def __init__(self):
+        self.palettes: Dict[str, dict] = {}
+        self.preferences: Dict[str, dict] = {}
+        # email -> (sequence, doc); the sequence is the pagination cursor
+        self.notify_emails: Dict[str, Tuple[int, dict]] = {}
+        self.status_checks: List[dict] = []
+        self.status_rollups: Dict[Tuple[str, str, datetime], dict] = {}
+        self.rate_limits: Dict[str, Tuple[int, datetime]] = {}
+        self._rate_limit_purge_at = 10000
+        self._seq = itertools.count(1)
+
+    async def migrate(self, palettes: List[dict], force: bool = False):
+        if not self.palettes:
+            self.palettes = {p["id"]: dict(p) for p in palettes}
+
+    # -- palettes --
+    async def list_palettes(self, primary: bool = False) -> List[dict]:
+        return [dict(p) for p in self.palettes.values()]
+
+    # -- preferences --
+    async def get_preference(self, session_id: str) -> Optional[dict]:
+        pref = self.preferences.get(session_id)
+        return dict(pref) if pref else None
+
+    async def upsert_preference(self, session_id: str, palette_id: str, now: datetime) -> dict:
+        self.preferences[session_id] = {"session_id": session_id, "palette_id": palette_id, "updated_at": now}
+        return dict(self.preferences[session_id])
+
+    async def get_preferences(self, session_ids: List[str]) -> List[dict]:
+        return [dict(self.preferences[s]) for s in set(session_ids) if s in self.preferences]
+
+    async def upsert_preferences(self, palette_ids: Dict[str, str], now: datetime):
+        for session_id, palette_id in palette_ids.items():
+            self.preferences[session_id] = {"session_id": session_id, "palette_id": palette_id, "updated_at": now}
+
+    # -- notify emails --
+    async def upsert_notify_emails(self, emails: Dict[str, Tuple[datetime, datetime]]):
+        for email, (first, last) in emails.items():
+            existing = self.notify_emails.get(email)
+            if existing:
+                existing[1]["updated_at"] = last
+            else:
+                self.notify_emails[email] = (next(self._seq), {"email": email, "created_at": first, "updated_at": last})
+
+    def _emails_after(self, after: Optional[str]):
+        try:
+            start = int(after) if after else 0
+        except ValueError:
+            raise InvalidCursor(after)
+        # dicts keep insertion order, which is sequence order; iterate a
+        # snapshot so concurrent upserts don't break a running export
+        return ((seq, doc) for seq, doc in list(self.notify_emails.values()) if seq > start)
+
+    async def page_notify_emails(self, after: Optional[str], limit: int) -> Tuple[List[dict], Optional[str]]:
+        rows = list(itertools.islice(self._emails_after(after), limit + 1))
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return [dict(doc) for _, doc in rows[:limit]], next_cursor
+
+    def iter_notify_emails(self, after: Optional[str], batch_size: int) -> AsyncIterator[List[dict]]:
+        return self._iter_emails(self._emails_after(after), batch_size)
+
+    async def _iter_emails(self, rows, batch_size: int) -> AsyncIterator[List[dict]]:
+        while True:
+            batch = [dict(doc) for _, doc in itertools.islice(rows, batch_size)]
+            if not batch:
+                return
+            yield batch
+
+    # -- status checks --
+    async def insert_status_checks(self, docs: List[dict]):
+        self.status_checks.extend(dict(doc) for doc in docs)
+
+    async def find_status_checks(self, client_name, since, until, after, descending, limit) -> List[dict]:
+        rows = [
+            doc for doc in self.status_checks
+            if (client_name is None or doc["client_name"] == client_name) and _in_range(doc["timestamp"], since, until)
+        ]
+        rows.sort(key=lambda doc: (doc["timestamp"], doc["id"]), reverse=descending)
+        if after:
+            rows = [doc for doc in rows if ((doc["timestamp"], doc["id"]) < after if descending else (doc["timestamp"], doc["id"]) > after)]
+        return [dict(doc) for doc in rows[:limit]]
+
+    async def increment_status_rollups(self, increments: List[RollupIncrement]):
+        for granularity, client_name, bucket, n, _ in increments:
+            key = (granularity, client_name, bucket)
+            row = self.status_rollups.setdefault(key, {"client_name": client_name, "bucket": bucket, "count": 0})
+            row["count"] += n
+
+    async def find_status_rollups(self, granularity, client_name, since, until, limit) -> List[dict]:
+        rows = [
+            dict(row) for (g, name, bucket), row in self.status_rollups.items()
+            if g == granularity and (client_name is None or name == client_name) and _in_range(bucket, since, until)
+        ]
+        rows.sort(key=lambda row: (row["bucket"], row["client_name"]))
+        return rows[:limit]
+
+    async def aggregate_status_stats(self, granularity, client_name, since, until, limit) -> List[dict]:
+        counts = Counter(
+            (bucket_start(doc["timestamp"], granularity), doc["client_name"])
+            for doc in self.status_checks
+            if (client_name is None or doc["client_name"] == client_name) and _in_range(doc["timestamp"], since, until)
+        )
+        rows = [{"client_name": name, "bucket": bucket, "count": n} for (bucket, name), n in sorted(counts.items())]
+        return rows[:limit]
+
+    async def backfill_status_rollups(self, since, until, minute_retention_seconds):
+        for granularity in ("minute", "hour"):
+            for row in await self.aggregate_status_stats(granularity, None, since, until, len(self.status_checks)):
+                self.status_rollups[(granularity, row["client_name"], row["bucket"])] = row
+
+    # -- rate limits --
+    async def hit_rate_limits(self, windows: List[RateWindow]) -> List[bool]:
+        now = datetime.utcnow()
+        allowed = []
+        for key, limit, expire_at in windows:
+            count, expires = self.rate_limits.get(key, (0, expire_at))
+            if expires <= now:
+                count, expires = 0, expire_at
+            ok = count < limit
+            if ok:
+                self.rate_limits[key] = (count + 1, expires)
+            allowed.append(ok)
+        # Windows are keyed by start time, so expired ones are never read again.
+        if len(self.rate_limits) > self._rate_limit_purge_at:
+            self.rate_limits = {k: v for k, v in self.rate_limits.items() if v[1] > now}
+            self._rate_limit_purge_at = max(10000, 2 * len(self.rate_limits))
+        return allowed
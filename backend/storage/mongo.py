@@ -0,0 +1,398 @@
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from motor.motor_asyncio import AsyncIOMotorClient
+import pymongo
+from pymongo import ASCENDING, DESCENDING, ReadPreference, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, ExecutionTimeout
+
+from cache import follow_change_stream
+from .base import InvalidCursor, RateWindow, RollupIncrement, Storage
+from .mongo_config import load_mongo_config
+
+
+logger = logging.getLogger(__name__)
+
+EMAIL_PROJECTION = {"_id": 0, "email": 1, "created_at": 1, "updated_at": 1}
+STATUS_PROJECTION = {"_id": 0, "id": 1, "client_name": 1, "timestamp": 1}
+ROLLUP_PROJECTION = {"_id": 0, "client_name": 1, "bucket": 1, "count": 1}
+
+# Index specs as (collection, keys, options). Any edit here changes the spec
+# hash, which is what triggers create_index on the next migration.
+INDEX_SPECS = [
+    ("preferences", [("session_id", 1)], {"unique": True}),
+    ("notify_emails", [("email", 1)], {"unique": True}),
+    ("palettes", [("id", 1)], {"unique": True}),
+    # TTL for rate limits
+    ("rate_limits", [("expireAt", 1)], {"expireAfterSeconds": 0}),
+    # Keyset pagination over status checks, with and without a client filter
+    ("status_checks", [("timestamp", 1), ("id", 1)], {}),
+    ("status_checks", [("client_name", 1), ("timestamp", 1), ("id", 1)], {}),
+    # Pre-aggregated per-client minute/hour counts; minute buckets expire
+    ("status_rollups", [("granularity", 1), ("bucket", 1), ("client_name", 1)], {}),
+    ("status_rollups", [("expireAt", 1)], {"expireAfterSeconds": 0}),
+]
+SCHEMA_META_ID = "schema"
+
+
+def _spec_hash(spec) -> str:
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _time_range(since: Optional[datetime], until: Optional[datetime]) -> dict:
+    time_range = {}
+    if since is not None:
+        time_range["$gte"] = since
+    if until is not None:
+        time_range["$lt"] = until
+    return time_range
+
+
+async def _bulk_upsert(collection, ops: List[UpdateOne]):
+    try:
+        await collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        # Two writers inserting the same new key race on the unique index;
+        # retrying turns the loser into a plain update.
+        retry = [ops[err["index"]] for err in errors if err.get("code") == 11000]
+        if len(retry) != len(errors):
+            raise
+        await collection.bulk_write(retry, ordered=False)
+
+
+def rollup_id(granularity: str, client_name: str, bucket: datetime) -> str:
+    return f"{granularity}|{client_name}|{bucket.isoformat()}"
+
+
+class MongoStorage(Storage):
+    name = "mongo"
+    # Network errors, server selection timeouts and maxTimeMS overruns
+    transient_errors = (ConnectionFailure, ExecutionTimeout)
+
+    def __init__(self, client: AsyncIOMotorClient, db_name: str, collection_specs: Optional[dict] = None,
+                 collection_options: Optional[Dict[str, dict]] = None):
+        self.client = client
+        self.db = client[db_name]
+        # Extra create_collection options per collection (e.g. time-series status_checks)
+        self.collection_specs = collection_specs or {}
+        # get_collection options (read preference, write concern) per collection
+        # for request-path calls; migrations and change streams use self.db.
+        self.collection_options = collection_options or {}
+        self._collections: dict = {}
+
+    @classmethod
+    def from_env(cls, env, **client_options) -> "MongoStorage":
+        config = load_mongo_config(env)
+        client = AsyncIOMotorClient(env["MONGO_URL"], **{**config.client_options, **client_options})
+        return cls(client, env.get("DB_NAME", "app_db"), _collection_specs(env), config.collection_options())
+
+    def collection(self, name: str):
+        coll = self._collections.get(name)
+        if coll is None:
+            coll = self._collections[name] = self.db.get_collection(name, **self.collection_options.get(name, {}))
+        return coll
+
+    async def close(self):
+        self.client.close()
+
+    async def ping(self):
+        await self.client.admin.command("ping")
+
+    def deadline(self, seconds: Optional[float]):
+        # Client-side operation timeout: bounds server selection, connection
+        # checkout and socket reads, and is sent to the server as maxTimeMS.
+        # Motor carries the context into its executor threads.
+        return pymongo.timeout(seconds)
+
+    # -- schema --
+    async def _ensure_collections(self):
+        for name, options in self.collection_specs.items():
+            existing = await self.db.list_collections(filter={"name": name}).to_list(1)
+            if not existing:
+                await self.db.create_collection(name, **options)
+                logger.info("Created collection %s", name)
+            elif "timeseries" in options and existing[0].get("type") != "timeseries":
+                logger.warning("%s exists as a regular collection; time-series storage needs a data migration", name)
+            elif "timeseries" in options:
+                await self.db.command("collMod", name, expireAfterSeconds=options.get("expireAfterSeconds", "off"))
+
+    async def migrate(self, palettes: List[dict], force: bool = False):
+        """Skips work already recorded in schema_meta; a warm start costs a single find_one."""
+        meta = await self.db.schema_meta.find_one({"_id": SCHEMA_META_ID}) or {}
+        updates = {}
+
+        index_hash = _spec_hash({"collections": self.collection_specs, "indexes": INDEX_SPECS})
+        if force or meta.get("index_hash") != index_hash:
+            # Collections first: create_index would implicitly create a regular one.
+            await self._ensure_collections()
+            for collection, keys, options in INDEX_SPECS:
+                await self.db[collection].create_index(keys, **options)
+            updates["index_hash"] = index_hash
+            logger.info("Indexes ensured (spec %s)", index_hash)
+
+        seed_hash = _spec_hash(palettes)
+        if force or meta.get("seed_hash") != seed_hash:
+            # Seed palettes if empty
+            count = await self.db.palettes.count_documents({})
+            if count == 0:
+                await self.db.palettes.insert_many([{"_id": p["id"], **p} for p in palettes])
+                logger.info("Seeded curated palettes")
+            updates["seed_hash"] = seed_hash
+
+        if updates:
+            await self.db.schema_meta.update_one(
+                {"_id": SCHEMA_META_ID},
+                {"$set": {**updates, "updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+
+    async def watch(self, collection: str, apply: Callable[[dict], None], on_reset: Callable[[], None]):
+        await follow_change_stream(self.db[collection], apply, on_reset)
+
+    # -- palettes --
+    async def list_palettes(self, primary: bool = False) -> List[dict]:
+        palettes = self.collection("palettes")
+        if primary:
+            palettes = palettes.with_options(read_preference=ReadPreference.PRIMARY)
+        return await palettes.find({}, {"_id": 0}).to_list(1000)
+
+    # -- preferences --
+    async def get_preference(self, session_id: str) -> Optional[dict]:
+        return await self.collection("preferences").find_one({"session_id": session_id}, {"_id": 0})
+
+    async def upsert_preference(self, session_id: str, palette_id: str, now: datetime) -> dict:
+        return await self.collection("preferences").find_one_and_update(
+            {"session_id": session_id},
+            {"$set": {"session_id": session_id, "palette_id": palette_id, "updated_at": now}},
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def get_preferences(self, session_ids: List[str]) -> List[dict]:
+        query = {"session_id": {"$in": list(set(session_ids))}}
+        return await self.collection("preferences").find(query, {"_id": 0}).to_list(None)
+
+    async def upsert_preferences(self, palette_ids: Dict[str, str], now: datetime):
+        await _bulk_upsert(self.collection("preferences"), [
+            UpdateOne(
+                {"session_id": session_id},
+                {"$set": {"session_id": session_id, "palette_id": palette_id, "updated_at": now}},
+                upsert=True,
+            )
+            for session_id, palette_id in palette_ids.items()
+        ])
+
+    # -- notify emails --
+    async def upsert_notify_email(self, email: str, now: datetime):
+        await self.collection("notify_emails").update_one(
+            {"email": email},
+            {"$setOnInsert": {"created_at": now}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+
+    async def upsert_notify_emails(self, emails: Dict[str, Tuple[datetime, datetime]]):
+        ops = [
+            UpdateOne(
+                {"email": email},
+                {"$setOnInsert": {"created_at": first}, "$set": {"updated_at": last}},
+                upsert=True,
+            )
+            for email, (first, last) in emails.items()
+        ]
+        await _bulk_upsert(self.collection("notify_emails"), ops)
+
+    @staticmethod
+    def _email_query(after: Optional[str]) -> dict:
+        if not after:
+            return {}
+        try:
+            return {"_id": {"$gt": ObjectId(after)}}
+        except (InvalidId, TypeError):
+            raise InvalidCursor(after)
+
+    async def page_notify_emails(self, after: Optional[str], limit: int) -> Tuple[List[dict], Optional[str]]:
+        # Keyset pagination on _id; one extra row tells us whether another page exists.
+        items = await (
+            self.collection("notify_emails").find(self._email_query(after), {**EMAIL_PROJECTION, "_id": 1})
+            .sort("_id", ASCENDING)
+            .limit(limit + 1)
+            .to_list(limit + 1)
+        )
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = str(items[-1]["_id"])
+        for item in items:
+            del item["_id"]
+        return items, next_cursor
+
+    def iter_notify_emails(self, after: Optional[str], batch_size: int) -> AsyncIterator[List[dict]]:
+        return self._iter_emails(self._email_query(after), batch_size)
+
+    async def _iter_emails(self, query: dict, batch_size: int) -> AsyncIterator[List[dict]]:
+        cursor = (
+            self.collection("notify_emails").find(query, EMAIL_PROJECTION)
+            .sort("_id", ASCENDING)
+            .batch_size(batch_size)
+        )
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    # -- status checks --
+    async def insert_status_checks(self, docs: List[dict]):
+        # insert_many adds _id to the dicts it is given
+        await self.collection("status_checks").insert_many([dict(doc) for doc in docs], ordered=False)
+
+    async def find_status_checks(self, client_name, since, until, after, descending, limit) -> List[dict]:
+        clauses = []
+        if client_name is not None:
+            clauses.append({"client_name": client_name})
+        time_range = _time_range(since, until)
+        if time_range:
+            clauses.append({"timestamp": time_range})
+        if after:
+            # Keyset on (timestamp, id): id breaks ties between equal timestamps.
+            ts, status_id = after
+            op = "$lt" if descending else "$gt"
+            clauses.append({"$or": [{"timestamp": {op: ts}}, {"timestamp": ts, "id": {op: status_id}}]})
+        query = {"$and": clauses} if clauses else {}
+        direction = DESCENDING if descending else ASCENDING
+        return await (
+            self.collection("status_checks").find(query, STATUS_PROJECTION)
+            .sort([("timestamp", direction), ("id", direction)])
+            .limit(limit)
+            .to_list(limit)
+        )
+
+    async def increment_status_rollups(self, increments: List[RollupIncrement]):
+        ops = [
+            UpdateOne(
+                {"_id": rollup_id(granularity, client_name, bucket)},
+                {
+                    "$inc": {"count": n},
+                    "$setOnInsert": {"granularity": granularity, "client_name": client_name, "bucket": bucket,
+                                     **({"expireAt": expire_at} if expire_at else {})},
+                },
+                upsert=True,
+            )
+            for granularity, client_name, bucket, n, expire_at in increments
+        ]
+        await self.collection("status_rollups").bulk_write(ops, ordered=False)
+
+    async def find_status_rollups(self, granularity, client_name, since, until, limit) -> List[dict]:
+        query = {"granularity": granularity}
+        time_range = _time_range(since, until)
+        if time_range:
+            query["bucket"] = time_range
+        if client_name is not None:
+            query["client_name"] = client_name
+        return await (
+            self.collection("status_rollups").find(query, ROLLUP_PROJECTION)
+            .sort([("bucket", ASCENDING), ("client_name", ASCENDING)])
+            .limit(limit)
+            .to_list(limit)
+        )
+
+    @staticmethod
+    def _raw_stats_pipeline(match: dict, granularity: str) -> List[dict]:
+        return [
+            {"$match": match},
+            {"$group": {
+                "_id": {"client_name": "$client_name",
+                        "bucket": {"$dateTrunc": {"date": "$timestamp", "unit": granularity}}},
+                "count": {"$sum": 1},
+            }},
+            {"$project": {"_id": 0, "client_name": "$_id.client_name", "bucket": "$_id.bucket", "count": 1}},
+        ]
+
+    async def aggregate_status_stats(self, granularity, client_name, since, until, limit) -> List[dict]:
+        match = {}
+        if client_name is not None:
+            match["client_name"] = client_name
+        time_range = _time_range(since, until)
+        if time_range:
+            match["timestamp"] = time_range
+        pipeline = self._raw_stats_pipeline(match, granularity) + [
+            {"$sort": {"bucket": 1, "client_name": 1}},
+            {"$limit": limit},
+        ]
+        return await self.collection("status_checks").aggregate(pipeline).to_list(limit)
+
+    async def backfill_status_rollups(self, since, until, minute_retention_seconds):
+        """Recompute rollup buckets from raw checks with $group + $merge."""
+        time_range = _time_range(since, until)
+        match = {"timestamp": time_range} if time_range else {}
+        for granularity in ("minute", "hour"):
+            pipeline = self._raw_stats_pipeline(match, granularity) + [
+                {"$set": {
+                    "_id": {"$concat": [granularity, "|", "$client_name", "|",
+                                        {"$dateToString": {"date": "$bucket", "format": "%Y-%m-%dT%H:%M:%S"}}]},
+                    "granularity": granularity,
+                }},
+            ]
+            if granularity == "minute" and minute_retention_seconds > 0:
+                pipeline.append({"$set": {"expireAt": {"$dateAdd": {
+                    "startDate": "$bucket", "unit": "second", "amount": minute_retention_seconds}}}})
+            pipeline.append({"$merge": {"into": "status_rollups", "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}})
+            await self.db.status_checks.aggregate(pipeline).to_list(None)
+            logger.info("Backfilled %s rollups", granularity)
+
+    # -- rate limits --
+    async def hit_rate_limits(self, windows: List[RateWindow]) -> List[bool]:
+        """One unordered bulk_write for all windows.
+
+        Each window is an upsert that only matches while its count is under the
+        limit; once the limit is reached the upsert collides with the existing
+        window document, so denials come back as duplicate-key write errors in
+        the same round trip. Window documents expire through the TTL index.
+        Windows that were under their limit are counted even when another
+        one in the batch is denied.
+        """
+        ops = [
+            UpdateOne(
+                {"_id": key, "count": {"$lt": limit}},
+                {"$inc": {"count": 1}, "$setOnInsert": {"expireAt": expire_at}},
+                upsert=True,
+            )
+            for key, limit, expire_at in windows
+        ]
+        allowed = [True] * len(ops)
+        try:
+            await self.collection("rate_limits").bulk_write(ops, ordered=False)
+        except BulkWriteError as exc:
+            errors = exc.details.get("writeErrors", [])
+            if any(err.get("code") != 11000 for err in errors):
+                raise
+            for err in errors:
+                allowed[err["index"]] = False
+        return allowed
+
+
+def _collection_specs(env) -> dict:
+    # status_checks can be a time-series collection (STATUS_TIMESERIES=1), with
+    # optional retention. An existing regular collection is not converted.
+    specs = {}
+    if env.get("STATUS_TIMESERIES", "0").lower() in ("1", "true", "yes"):
+        options = {"timeseries": {
+            "timeField": "timestamp",
+            "metaField": "client_name",
+            "granularity": env.get("STATUS_TIMESERIES_GRANULARITY", "seconds"),
+        }}
+        retention = int(env.get("STATUS_RETENTION_SECONDS", "0"))
+        if retention > 0:
+            options["expireAfterSeconds"] = retention
+        specs["status_checks"] = options
+    return specs
@@ -0,0 +1,135 @@
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from pymongo import ReadPreference
+from pymongo.write_concern import WriteConcern
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11; JSON config files still work
+    tomllib = None
+
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Pool settings with an env override each: MONGO_<SNAKE_CASE>=value
+CLIENT_OPTIONS = {
+    "maxPoolSize": "MONGO_MAX_POOL_SIZE",
+    "minPoolSize": "MONGO_MIN_POOL_SIZE",
+    "maxIdleTimeMS": "MONGO_MAX_IDLE_TIME_MS",
+    "waitQueueTimeoutMS": "MONGO_WAIT_QUEUE_TIMEOUT_MS",
+    "serverSelectionTimeoutMS": "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+}
+
+# Cached or export-only reads can lag the primary; ephemeral counters and raw
+# checks trade durability for latency, while preferences must survive a
+# failover.
+DEFAULT_READ_PREFERENCES = {
+    "palettes": "secondaryPreferred",
+    "notify_emails": "secondaryPreferred",
+}
+DEFAULT_WRITE_CONCERNS = {
+    "rate_limits": {"w": 1, "j": False},
+    "status_checks": {"w": 1, "j": False},
+    "preferences": {"w": "majority"},
+}
+
+
+def parse_write_concern(value) -> dict:
+    """A WriteConcern spec from a file value ({"w": 1, "j": false}, "majority",
+    2) or an env string ("majority", "1", "w=1,j=false,wtimeout=500")."""
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, int):
+        return {"w": value}
+    spec = {}
+    for part in str(value).split(","):
+        key, sep, raw = part.strip().partition("=")
+        if not sep:
+            key, raw = "w", key
+        raw = raw.strip()
+        if raw.lower() in ("true", "false"):
+            spec[key.strip()] = raw.lower() == "true"
+        elif raw.isdigit():
+            spec[key.strip()] = int(raw)
+        else:
+            spec[key.strip()] = raw
+    return spec
+
+
+@dataclass
+class MongoConfig:
+    """Client pool options plus read preference and write concern per
+    collection, layered defaults < MONGO_CONFIG_FILE < env."""
+
+    client_options: Dict[str, Any] = field(default_factory=dict)
+    read_preferences: Dict[str, str] = field(default_factory=lambda: dict(DEFAULT_READ_PREFERENCES))
+    write_concerns: Dict[str, dict] = field(default_factory=lambda: dict(DEFAULT_WRITE_CONCERNS))
+
+    def collection_options(self) -> Dict[str, dict]:
+        """get_collection() keyword arguments per configured collection."""
+        options: Dict[str, dict] = {}
+        for name, mode in self.read_preferences.items():
+            if mode not in READ_PREFERENCES:
+                raise ValueError(f"Unknown read preference {mode!r} for {name}")
+            options.setdefault(name, {})["read_preference"] = READ_PREFERENCES[mode]
+        for name, spec in self.write_concerns.items():
+            options.setdefault(name, {})["write_concern"] = WriteConcern(**spec)
+        return options
+
+
+def _read_file(path: str) -> dict:
+    if path.endswith(".toml"):
+        if tomllib is None:
+            raise ValueError(f"{path}: TOML config needs Python 3.11+; use JSON")
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_mongo_config(env, path: Optional[str] = None) -> MongoConfig:
+    """Build from an optional JSON/TOML file (MONGO_CONFIG_FILE) shaped like
+
+        [client]
+        maxPoolSize = 200
+        [collections.palettes]
+        read_preference = "secondaryPreferred"
+        [collections.rate_limits]
+        write_concern = { w = 1, j = false }
+
+    then env: the MONGO_* pool variables in CLIENT_OPTIONS and, per
+    collection, MONGO_READ_PREFERENCE_<NAME> / MONGO_WRITE_CONCERN_<NAME>.
+    """
+    config = MongoConfig()
+    path = path or env.get("MONGO_CONFIG_FILE")
+    if path:
+        data = _read_file(path)
+        config.client_options.update(data.get("client", {}))
+        for name, options in data.get("collections", {}).items():
+            if "read_preference" in options:
+                config.read_preferences[name] = options["read_preference"]
+            if "write_concern" in options:
+                config.write_concerns[name] = parse_write_concern(options["write_concern"])
+
+    for option, env_name in CLIENT_OPTIONS.items():
+        if env.get(env_name):
+            config.client_options[option] = int(env[env_name])
+    # Calls without a storage deadline (migrations, change streams) should
+    # still give up on an unreachable cluster within the longest one, not
+    # the driver's 30s.
+    config.client_options.setdefault(
+        "serverSelectionTimeoutMS", int(env.get("STORAGE_SLOW_TIMEOUT_MS", "10000")))
+    for env_name, value in env.items():
+        if env_name.startswith("MONGO_READ_PREFERENCE_"):
+            config.read_preferences[env_name[len("MONGO_READ_PREFERENCE_"):].lower()] = value
+        elif env_name.startswith("MONGO_WRITE_CONCERN_"):
+            config.write_concerns[env_name[len("MONGO_WRITE_CONCERN_"):].lower()] = parse_write_concern(value)
+    return config
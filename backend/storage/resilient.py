@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from .base import RateWindow, RollupIncrement, Storage, StorageUnavailable
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails fast for
+    `reset_timeout` seconds; then lets a single probe call through, which
+    closes it again on success or re-opens it on failure."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != "closed"
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def success(self):
+        if self.state != "closed":
+            logger.info("Storage circuit closed")
+            metrics.storage_circuit_open.set(value=0)
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state == "closed":
+                logger.error("Storage circuit opened after %d consecutive failures", self.failures)
+            self.state = "open"
+            self.opened_at = self.clock()
+            metrics.storage_circuit_open.set(value=1)
+
+    def abandon(self):
+        """The call ended without telling us anything (e.g. cancelled)."""
+        self._probing = False
+
+
+class ResilientStorage(Storage):
+    """Deadlines and a circuit breaker around another backend.
+
+    Every call gets a deadline (reads, writes and slow scans have separate
+    budgets); timeouts and the backend's transient errors count as failures.
+    While the breaker is open calls fail immediately with StorageUnavailable,
+    so callers can degrade instead of piling up behind a stalled database.
+    Long maintenance calls (migrate, backfill) have no deadline.
+    """
+
+    def __init__(self, inner: Storage, breaker: Optional[CircuitBreaker] = None, read_timeout: float = 1.0,
+                 write_timeout: float = 2.0, slow_timeout: float = 10.0):
+        self.inner = inner
+        self.breaker = breaker or CircuitBreaker()
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.slow_timeout = slow_timeout
+
+    @property
+    def name(self) -> str:
+        return self.inner.name
+
+    async def _call(self, timeout: Optional[float], fn, *args):
+        operation = fn.__name__
+        if not self.breaker.allow():
+            metrics.storage_failures.inc(operation, "circuit_open")
+            raise StorageUnavailable(f"{operation}: circuit open")
+        try:
+            # The driver deadline (where supported) stops the operation itself;
+            # wait_for only stops us waiting on it.
+            with self.inner.deadline(timeout):
+                result = await asyncio.wait_for(fn(*args), timeout)
+        except asyncio.TimeoutError:
+            self.breaker.failure()
+            metrics.storage_failures.inc(operation, "timeout")
+            raise StorageUnavailable(f"{operation}: timed out after {timeout}s")
+        except self.inner.transient_errors as exc:
+            self.breaker.failure()
+            metrics.storage_failures.inc(operation, "error")
+            raise StorageUnavailable(f"{operation}: {exc}") from exc
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            raise
+        except Exception:
+            # The backend answered, just not happily (e.g. a bad cursor)
+            self.breaker.success()
+            raise
+        self.breaker.success()
+        return result
+
+    # -- lifecycle --
+    async def migrate(self, palettes: List[dict], force: bool = False):
+        await self._call(None, self.inner.migrate, palettes, force)
+
+    async def close(self):
+        await self.inner.close()
+
+    async def ping(self):
+        await self._call(self.read_timeout, self.inner.ping)
+
+    async def watch(self, collection: str, apply: Callable[[dict], None], on_reset: Callable[[], None]):
+        # Long-lived and self-retrying; not subject to deadlines
+        await self.inner.watch(collection, apply, on_reset)
+
+    # -- palettes --
+    async def list_palettes(self, primary: bool = False) -> List[dict]:
+        return await self._call(self.read_timeout, self.inner.list_palettes, primary)
+
+    # -- preferences --
+    async def get_preference(self, session_id: str) -> Optional[dict]:
+        return await self._call(self.read_timeout, self.inner.get_preference, session_id)
+
+    async def upsert_preference(self, session_id: str, palette_id: str, now: datetime) -> dict:
+        return await self._call(self.write_timeout, self.inner.upsert_preference, session_id, palette_id, now)
+
+    async def get_preferences(self, session_ids: List[str]) -> List[dict]:
+        return await self._call(self.read_timeout, self.inner.get_preferences, session_ids)
+
+    async def upsert_preferences(self, palette_ids: Dict[str, str], now: datetime):
+        await self._call(self.write_timeout, self.inner.upsert_preferences, palette_ids, now)
+
+    # -- notify emails --
+    async def upsert_notify_email(self, email: str, now: datetime):
+        await self._call(self.write_timeout, self.inner.upsert_notify_email, email, now)
+
+    async def upsert_notify_emails(self, emails: Dict[str, Tuple[datetime, datetime]]):
+        await self._call(self.write_timeout, self.inner.upsert_notify_emails, emails)
+
+    async def page_notify_emails(self, after: Optional[str], limit: int) -> Tuple[List[dict], Optional[str]]:
+        return await self._call(self.slow_timeout, self.inner.page_notify_emails, after, limit)
+
+    def iter_notify_emails(self, after: Optional[str], batch_size: int) -> AsyncIterator[List[dict]]:
+        # Streamed exports check the breaker up front only; a stall mid-stream
+        # ends the response rather than failing it with a status code.
+        if not self.breaker.allow():
+            metrics.storage_failures.inc("iter_notify_emails", "circuit_open")
+            raise StorageUnavailable("iter_notify_emails: circuit open")
+        self.breaker.abandon()
+        return self.inner.iter_notify_emails(after, batch_size)
+
+    # -- status checks --
+    async def insert_status_checks(self, docs: List[dict]):
+        await self._call(self.write_timeout, self.inner.insert_status_checks, docs)
+
+    async def find_status_checks(self, client_name, since, until, after, descending, limit) -> List[dict]:
+        return await self._call(self.read_timeout, self.inner.find_status_checks,
+                                client_name, since, until, after, descending, limit)
+
+    async def increment_status_rollups(self, increments: List[RollupIncrement]):
+        await self._call(self.write_timeout, self.inner.increment_status_rollups, increments)
+
+    async def find_status_rollups(self, granularity, client_name, since, until, limit) -> List[dict]:
+        return await self._call(self.read_timeout, self.inner.find_status_rollups,
+                                granularity, client_name, since, until, limit)
+
+    async def aggregate_status_stats(self, granularity, client_name, since, until, limit) -> List[dict]:
+        return await self._call(self.slow_timeout, self.inner.aggregate_status_stats,
+                                granularity, client_name, since, until, limit)
+
+    async def backfill_status_rollups(self, since, until, minute_retention_seconds):
+        await self._call(None, self.inner.backfill_status_rollups, since, until, minute_retention_seconds)
+
+    # -- rate limits --
+    async def hit_rate_limits(self, windows: List[RateWindow]) -> List[bool]:
+        return await self._call(self.write_timeout, self.inner.hit_rate_limits, windows)
@@ -0,0 +1,370 @@
+import asyncio
+import functools
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from metrics import record_db_call
+from .base import InvalidCursor, RateWindow, RollupIncrement, Storage
+
+
+# Fixed-width timestamps so TEXT ordering matches time ordering.
+_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+# Rollup bucket expressions over the fixed-width timestamp text
+_BUCKET_SQL = {
+    "minute": "substr(timestamp, 1, 16) || ':00.000000'",
+    "hour": "substr(timestamp, 1, 13) || ':00:00.000000'",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS palettes (
+    position INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS preferences (
+    session_id TEXT PRIMARY KEY,
+    palette_id TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notify_emails (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT NOT NULL UNIQUE,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS status_checks (
+    id TEXT PRIMARY KEY,
+    client_name TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS status_checks_ts ON status_checks (timestamp, id);
+CREATE INDEX IF NOT EXISTS status_checks_client_ts ON status_checks (client_name, timestamp, id);
+CREATE TABLE IF NOT EXISTS status_rollups (
+    granularity TEXT NOT NULL,
+    client_name TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    expire_at TEXT,
+    PRIMARY KEY (granularity, bucket, client_name)
+);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL,
+    expire_at TEXT NOT NULL
+);
+"""
+
+# Expired rate-limit windows and rollup buckets are deleted every N writes.
+PURGE_EVERY = 1000
+# Older SQLite builds cap bound parameters per statement at 999.
+MAX_PARAMS = 900
+
+
+def _ts(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime(_TS_FORMAT) if value is not None else None
+
+
+def _dt(value: Optional[str]) -> Optional[datetime]:
+    return datetime.strptime(value, _TS_FORMAT) if value is not None else None
+
+
+def _time_clauses(column: str, since, until, where: List[str], params: list):
+    if since is not None:
+        where.append(f"{column} >= ?")
+        params.append(_ts(since))
+    if until is not None:
+        where.append(f"{column} < ?")
+        params.append(_ts(until))
+
+
+class SqliteStorage(Storage):
+    """Single-file SQLite in WAL mode.
+
+    All statements run on one dedicated thread with one connection, so
+    writes are serialized per process; several workers can share the file
+    (WAL readers don't block the writer, busy_timeout covers writer overlap).
+    """
+
+    name = "sqlite"
+    # "database is locked" and friends
+    transient_errors = (sqlite3.OperationalError,)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._conn = conn
+        return self._conn
+
+    def _call(self, fn, write: bool):
+        conn = self._connect()
+        # Writers take the lock up front instead of upgrading mid-transaction
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    async def _run(self, table: str, op: str, fn, write: bool = False):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(self._call, fn, write))
+        finally:
+            # Counted like a Mongo round trip in Server-Timing
+            record_db_call(table, op, time.perf_counter() - start)
+
+    def _maybe_purge(self, conn: sqlite3.Connection):
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            now = _ts(datetime.utcnow())
+            conn.execute("DELETE FROM rate_limits WHERE expire_at <= ?", (now,))
+            conn.execute("DELETE FROM status_rollups WHERE expire_at IS NOT NULL AND expire_at <= ?", (now,))
+
+    async def close(self):
+        def close_conn():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, close_conn)
+        self._executor.shutdown(wait=True)
+
+    # -- schema --
+    async def migrate(self, palettes: List[dict], force: bool = False):
+        def migrate(conn):
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            if conn.execute("SELECT COUNT(*) FROM palettes").fetchone()[0] == 0:
+                conn.executemany(
+                    "INSERT INTO palettes (id, doc) VALUES (?, ?)",
+                    [(p["id"], json.dumps(p)) for p in palettes],
+                )
+        await self._run("schema", "migrate", migrate, write=True)
+
+    async def ping(self):
+        await self._run("schema", "ping", lambda conn: conn.execute("SELECT 1").fetchone())
+
+    # -- palettes --
+    async def list_palettes(self, primary: bool = False) -> List[dict]:
+        def list_palettes(conn):
+            return [json.loads(doc) for (doc,) in conn.execute("SELECT doc FROM palettes ORDER BY position")]
+        return await self._run("palettes", "find", list_palettes)
+
+    # -- preferences --
+    async def get_preference(self, session_id: str) -> Optional[dict]:
+        def get(conn):
+            return conn.execute(
+                "SELECT session_id, palette_id, updated_at FROM preferences WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        row = await self._run("preferences", "find", get)
+        if row is None:
+            return None
+        return {"session_id": row[0], "palette_id": row[1], "updated_at": _dt(row[2])}
+
+    async def upsert_preference(self, session_id: str, palette_id: str, now: datetime) -> dict:
+        def upsert(conn):
+            conn.execute(
+                "INSERT INTO preferences (session_id, palette_id, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET palette_id = excluded.palette_id, updated_at = excluded.updated_at",
+                (session_id, palette_id, _ts(now)),
+            )
+        await self._run("preferences", "upsert", upsert, write=True)
+        return {"session_id": session_id, "palette_id": palette_id, "updated_at": now}
+
+    async def get_preferences(self, session_ids: List[str]) -> List[dict]:
+        def get(conn):
+            ids = list(set(session_ids))
+            rows = []
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(ids), MAX_PARAMS):
+                chunk = ids[i:i + MAX_PARAMS]
+                rows += conn.execute(
+                    "SELECT session_id, palette_id, updated_at FROM preferences "
+                    f"WHERE session_id IN ({', '.join('?' * len(chunk))})", chunk,
+                ).fetchall()
+            return rows
+        rows = await self._run("preferences", "find", get)
+        return [{"session_id": row[0], "palette_id": row[1], "updated_at": _dt(row[2])} for row in rows]
+
+    async def upsert_preferences(self, palette_ids: Dict[str, str], now: datetime):
+        def upsert(conn):
+            conn.executemany(
+                "INSERT INTO preferences (session_id, palette_id, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET palette_id = excluded.palette_id, updated_at = excluded.updated_at",
+                [(session_id, palette_id, _ts(now)) for session_id, palette_id in palette_ids.items()],
+            )
+        await self._run("preferences", "upsert", upsert, write=True)
+
+    # -- notify emails --
+    async def upsert_notify_emails(self, emails: Dict[str, Tuple[datetime, datetime]]):
+        def upsert(conn):
+            conn.executemany(
+                "INSERT INTO notify_emails (email, created_at, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (email) DO UPDATE SET updated_at = excluded.updated_at",
+                [(email, _ts(first), _ts(last)) for email, (first, last) in emails.items()],
+            )
+        await self._run("notify_emails", "upsert", upsert, write=True)
+
+    @staticmethod
+    def _seq(after: Optional[str]) -> int:
+        try:
+            return int(after) if after else 0
+        except ValueError:
+            raise InvalidCursor(after)
+
+    async def _emails_page(self, start: int, limit: int) -> List[tuple]:
+        def page(conn):
+            return conn.execute(
+                "SELECT seq, email, created_at, updated_at FROM notify_emails WHERE seq > ? ORDER BY seq LIMIT ?",
+                (start, limit),
+            ).fetchall()
+        return await self._run("notify_emails", "find", page)
+
+    @staticmethod
+    def _email_doc(row) -> dict:
+        return {"email": row[1], "created_at": _dt(row[2]), "updated_at": _dt(row[3])}
+
+    async def page_notify_emails(self, after: Optional[str], limit: int) -> Tuple[List[dict], Optional[str]]:
+        rows = await self._emails_page(self._seq(after), limit + 1)
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return [self._email_doc(row) for row in rows[:limit]], next_cursor
+
+    def iter_notify_emails(self, after: Optional[str], batch_size: int) -> AsyncIterator[List[dict]]:
+        return self._iter_emails(self._seq(after), batch_size)
+
+    async def _iter_emails(self, start: int, batch_size: int) -> AsyncIterator[List[dict]]:
+        while True:
+            rows = await self._emails_page(start, batch_size)
+            if not rows:
+                return
+            start = rows[-1][0]
+            yield [self._email_doc(row) for row in rows]
+
+    # -- status checks --
+    async def insert_status_checks(self, docs: List[dict]):
+        def insert(conn):
+            conn.executemany(
+                "INSERT INTO status_checks (id, client_name, timestamp) VALUES (?, ?, ?)",
+                [(doc["id"], doc["client_name"], _ts(doc["timestamp"])) for doc in docs],
+            )
+        await self._run("status_checks", "insert", insert, write=True)
+
+    async def find_status_checks(self, client_name, since, until, after, descending, limit) -> List[dict]:
+        where, params = [], []
+        if client_name is not None:
+            where.append("client_name = ?")
+            params.append(client_name)
+        _time_clauses("timestamp", since, until, where, params)
+        if after:
+            op = "<" if descending else ">"
+            where.append(f"(timestamp {op} ? OR (timestamp = ? AND id {op} ?))")
+            params.extend([_ts(after[0]), _ts(after[0]), after[1]])
+        direction = "DESC" if descending else "ASC"
+        sql = "SELECT id, client_name, timestamp FROM status_checks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY timestamp {direction}, id {direction} LIMIT ?"
+        params.append(limit)
+
+        def find(conn):
+            return conn.execute(sql, params).fetchall()
+        rows = await self._run("status_checks", "find", find)
+        return [{"id": r[0], "client_name": r[1], "timestamp": _dt(r[2])} for r in rows]
+
+    async def increment_status_rollups(self, increments: List[RollupIncrement]):
+        def increment(conn):
+            conn.executemany(
+                "INSERT INTO status_rollups (granularity, client_name, bucket, count, expire_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (granularity, bucket, client_name) DO UPDATE SET count = count + excluded.count",
+                [(g, name, _ts(bucket), n, _ts(expire_at)) for g, name, bucket, n, expire_at in increments],
+            )
+            self._maybe_purge(conn)
+        await self._run("status_rollups", "upsert", increment, write=True)
+
+    async def _stats(self, table: str, sql: str, params: list) -> List[dict]:
+        def query(conn):
+            return conn.execute(sql, params).fetchall()
+        rows = await self._run(table, "find", query)
+        return [{"client_name": r[0], "bucket": _dt(r[1]), "count": r[2]} for r in rows]
+
+    async def find_status_rollups(self, granularity, client_name, since, until, limit) -> List[dict]:
+        where, params = ["granularity = ?"], [granularity]
+        if client_name is not None:
+            where.append("client_name = ?")
+            params.append(client_name)
+        _time_clauses("bucket", since, until, where, params)
+        sql = (f"SELECT client_name, bucket, count FROM status_rollups WHERE {' AND '.join(where)} "
+               "ORDER BY bucket, client_name LIMIT ?")
+        return await self._stats("status_rollups", sql, params + [limit])
+
+    def _raw_stats_sql(self, granularity, client_name, since, until) -> Tuple[str, list]:
+        where, params = ["1"], []
+        if client_name is not None:
+            where.append("client_name = ?")
+            params.append(client_name)
+        _time_clauses("timestamp", since, until, where, params)
+        bucket = _BUCKET_SQL[granularity]
+        sql = (f"SELECT client_name, {bucket} AS bucket, COUNT(*) FROM status_checks "
+               f"WHERE {' AND '.join(where)} GROUP BY client_name, bucket")
+        return sql, params
+
+    async def aggregate_status_stats(self, granularity, client_name, since, until, limit) -> List[dict]:
+        sql, params = self._raw_stats_sql(granularity, client_name, since, until)
+        return await self._stats("status_checks", sql + " ORDER BY bucket, client_name LIMIT ?", params + [limit])
+
+    async def backfill_status_rollups(self, since, until, minute_retention_seconds):
+        statements = []
+        for granularity in ("minute", "hour"):
+            sql, params = self._raw_stats_sql(granularity, None, since, until)
+            expire = "NULL"
+            if granularity == "minute" and minute_retention_seconds > 0:
+                expire = f"strftime('%Y-%m-%dT%H:%M:%S.000000', bucket, '+{int(minute_retention_seconds)} seconds')"
+            statements.append((
+                "INSERT INTO status_rollups (granularity, client_name, bucket, count, expire_at) "
+                f"SELECT ?, client_name, bucket, cnt, {expire} FROM ({sql.replace('COUNT(*)', 'COUNT(*) AS cnt')}) WHERE 1 "
+                "ON CONFLICT (granularity, bucket, client_name) DO UPDATE SET count = excluded.count",
+                [granularity] + params,
+            ))
+
+        def backfill(conn):
+            for sql, params in statements:
+                conn.execute(sql, params)
+        await self._run("status_rollups", "backfill", backfill, write=True)
+
+    # -- rate limits --
+    async def hit_rate_limits(self, windows: List[RateWindow]) -> List[bool]:
+        now = _ts(datetime.utcnow())
+
+        def hit(conn):
+            allowed = []
+            for key, limit, expire_at in windows:
+                row = conn.execute("SELECT count, expire_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                count = row[0] if row and row[1] > now else 0
+                ok = count < limit
+                if ok:
+                    conn.execute(
+                        "INSERT INTO rate_limits (key, count, expire_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET count = excluded.count, expire_at = excluded.expire_at",
+                        (key, count + 1, _ts(expire_at)),
+                    )
+                allowed.append(ok)
+            self._maybe_purge(conn)
+            return allowed
+        return await self._run("rate_limits", "upsert", hit, write=True)
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class NotifyWriteBehind:
+    """Buffers notify upserts and flushes them to storage in batches.
+
+    Items are coalesced by email within a batch (earliest timestamp feeds
+    created_at, latest feeds updated_at). A batch is flushed once it reaches
+    `batch_size` distinct emails or `flush_interval` seconds after its first
+    item, whichever comes first. A batch that fails to flush is passed to
+    `on_failure(batch, exc)`, if given; it is dropped if that raises too.
+    """
+
+    def __init__(self, storage, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.2, put_timeout: float = 1.0,
+                 on_failure: Optional[Callable[[Dict[str, Tuple[datetime, datetime]], Exception], Awaitable[None]]] = None):
+        self.storage = storage
+        self.on_failure = on_failure
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._batch_ready = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, email: str, now: datetime) -> bool:
+        """Queue an upsert. Waits up to put_timeout while the queue is full and
+        returns False if it stays full, so the caller can write inline instead."""
+        if self._task is None or self._task.done():
+            return False
+        try:
+            await asyncio.wait_for(self.queue.put((email, now)), self.put_timeout)
+        except asyncio.TimeoutError:
+            return False
+        if self.queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def close(self):
+        """Flush everything queued so far and stop the worker."""
+        if self._task is None:
+            return
+        self._closing = True
+        await self.queue.put(_STOP)
+        self._batch_ready.set()
+        await self._task
+        self._task = None
+        self._closing = False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            pending: Dict[str, Tuple[datetime, datetime]] = {}
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+            self._merge(pending, item)
+
+            # Once closing, STOP may already be queued behind this item and
+            # clearing the event would lose close()'s wake-up.
+            if self.queue.qsize() < self.batch_size and not self._closing:
+                self._batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            while len(pending) < self.batch_size and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                self._merge(pending, item)
+            # A STOP that arrived behind a full batch is picked up on the next pass.
+            await self._flush(pending)
+
+    @staticmethod
+    def _merge(pending, item):
+        email, now = item
+        seen = pending.get(email)
+        pending[email] = (min(seen[0], now), max(seen[1], now)) if seen else (now, now)
+
+    async def _flush(self, pending):
+        try:
+            await self.storage.upsert_notify_emails(pending)
+        except Exception as exc:
+            if self.on_failure is not None:
+                try:
+                    await self.on_failure(pending, exc)
+                    return
+                except Exception:
+                    pass
+            logger.exception("Notify flush: dropped batch of %d upserts", len(pending))
@@ -13,12 +13,36 @@ export const savePreference = async ({ sessionId, paletteId }) => {
     session_id: sessionId,
     palette_id: paletteId,
   });
-  return data; // { session_id, palette_id, updated_at }
+  return data; // { session_id, palette_id, updated_at, token? }
 };
 
-export const getPreference = async (sessionId) => {
-  const { data } = await axios.get(`${API}/preferences`, { params: { session_id: sessionId } });
-  return data; // { session_id, palette_id, updated_at }
+// token (from a previous save) lets the backend answer without a DB read
+export const getPreference = async (sessionId, token) => {
+  const params = { session_id: sessionId };
+  if (token) params.token = token;
+  const { data } = await axios.get(`${API}/preferences`, { params });
+  return data; // { session_id, palette_id, updated_at, token? }
+};
+
+export const eventsSupported = typeof EventSource !== "undefined";
+
+// Server-sent palette and preference updates; the first "palettes" event is
+// the current set. EventSource reconnects on its own; onClosed runs if the
+// server refuses the stream (e.g. a 404 with events turned off). Returns a
+// function that closes the stream.
+export const subscribeEvents = ({ sessionId, onPalettes, onPreference, onClosed }) => {
+  if (!eventsSupported) return () => {};
+  const url = new URL(`${API}/events`, window.location.href);
+  if (sessionId) url.searchParams.set("session_id", sessionId);
+  const source = new EventSource(url);
+  if (onPalettes) source.addEventListener("palettes", (e) => onPalettes(JSON.parse(e.data)));
+  if (onPreference) source.addEventListener("preference", (e) => onPreference(JSON.parse(e.data)));
+  if (onClosed) {
+    source.addEventListener("error", () => {
+      if (source.readyState === EventSource.CLOSED) onClosed();
+    });
+  }
+  return () => source.close();
 };
 
 export const notifyEmail = async (email) => {
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import ThemePicker from "../components/ThemePicker";
 import { features, microcopy, palettes as mockPalettes } from "../mock";
 import { Button } from "../components/ui/button";
@@ -6,7 +6,7 @@ import { Card, CardContent } from "../components/ui/card";
 import { Separator } from "../components/ui/separator";
 import { Input } from "../components/ui/input";
 import * as Icons from "lucide-react";
-import { getPalettes, savePreference, notifyEmail, getPreference } from "../lib/api";
+import { getPalettes, savePreference, notifyEmail, getPreference, subscribeEvents, eventsSupported } from "../lib/api";
 import { useToast } from "../hooks/use-toast";
 
 function applyThemeVars(theme) {
@@ -19,6 +19,30 @@ function applyThemeVars(theme) {
   root.style.setProperty("--msk-subtle", theme.subtle);
 }
 
+function applyPreference(pref, list) {
+  const p = (list.length ? list : mockPalettes).find((x) => x.id === pref.palette_id);
+  if (p) {
+    applyThemeVars(p);
+    localStorage.setItem("timepage_theme", JSON.stringify(p));
+  }
+}
+
+// Same content keeps the same array, so effects keyed on it don't re-run
+function samePalettes(a, b) {
+  return a.length === b.length && JSON.stringify(a) === JSON.stringify(b);
+}
+
+const keepIfSame = (next) => (prev) => (samePalettes(prev, next) ? prev : next);
+
+async function fetchPalettes() {
+  try {
+    const data = await getPalettes();
+    return Array.isArray(data) && data.length ? data : mockPalettes;
+  } catch (e) {
+    return mockPalettes;
+  }
+}
+
 function loadInitialTheme() {
   const saved = localStorage.getItem("timepage_theme");
   const theme = saved ? JSON.parse(saved) : mockPalettes[0];
@@ -29,47 +53,62 @@ export default function Home() {
   const { toast } = useToast();
   const [palettes, setPalettes] = useState([]);
   const [email, setEmail] = useState("");
+  const [sessionId, setSessionId] = useState(() => localStorage.getItem("tp_session_id"));
+  const palettesRef = useRef([]);
+  palettesRef.current = palettes;
 
   useEffect(() => {
     loadInitialTheme();
   }, []);
 
-  useEffect(() => {
-    (async () => {
-      try {
-        const data = await getPalettes();
-        if (Array.isArray(data) && data.length) setPalettes(data);
-        else setPalettes(mockPalettes);
-      } catch (e) {
-        setPalettes(mockPalettes);
-      }
-    })();
-  }, []);
-
   // Restore server-saved preference if available
   useEffect(() => {
     (async () => {
       try {
         const sid = localStorage.getItem("tp_session_id");
-        if (!sid) return;
-        const pref = await getPreference(sid);
-        const list = palettes.length ? palettes : mockPalettes;
-        const p = list.find((x) => x.id === pref.palette_id);
-        if (p) {
-          applyThemeVars(p);
-          localStorage.setItem("timepage_theme", JSON.stringify(p));
-        }
+        // Wait for the palette list (from the event stream or the fallback fetch)
+        if (!sid || !palettes.length) return;
+        const pref = await getPreference(sid, localStorage.getItem("tp_pref_token"));
+        applyPreference(pref, palettes);
       } catch (e) {
         // ignore and keep local theme
       }
     })();
   }, [palettes]);
 
+  // Palettes and preference updates pushed by the backend. The stream opens
+  // with the current palette set, so it also does the initial load; it is
+  // reopened for a new session id (a resubscribe repeats the same set).
+  // Without a stream the list is fetched once instead.
+  useEffect(() => {
+    const loadOnce = () => {
+      if (!palettesRef.current.length) fetchPalettes().then((list) => setPalettes(keepIfSame(list)));
+    };
+    if (!eventsSupported) {
+      loadOnce();
+      return undefined;
+    }
+    return subscribeEvents({
+      sessionId: sessionId || undefined,
+      onPalettes: (data) => {
+        if (Array.isArray(data) && data.length) setPalettes(keepIfSame(data));
+      },
+      onPreference: (pref) => {
+        if (pref.token) localStorage.setItem("tp_pref_token", pref.token);
+        applyPreference(pref, palettesRef.current);
+      },
+      // Events turned off on the server, or the stream refused
+      onClosed: loadOnce,
+    });
+  }, [sessionId]);
+
   const onApplyPersist = async (palette) => {
     try {
       const existingSession = localStorage.getItem("tp_session_id");
       const res = await savePreference({ sessionId: existingSession || undefined, paletteId: palette.id });
       localStorage.setItem("tp_session_id", res.session_id);
+      setSessionId(res.session_id);
+      if (res.token) localStorage.setItem("tp_pref_token", res.token);
       toast({ title: "Theme saved", description: `Applied ${palette.name} for your session.` });
     } catch (e) {
       toast({ title: "Saved locally", description: "Backend unreachable. We'll sync next time.", });
@@ -0,0 +1,19 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other as top-level modules (`import metrics`)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage_backend(request, tmp_path):
+    """A migrated, empty storage backend of each self-contained kind."""
+    from storage import create_storage
+
+    backend = create_storage({"STORAGE_BACKEND": request.param, "SQLITE_PATH": str(tmp_path / "app.db")})
+    asyncio.run(backend.migrate([]))
+    yield backend
+    asyncio.run(backend.close())
@@ -0,0 +1,102 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("NOTIFY_SPOOL_DIR", tempfile.mkdtemp())
+
+import httpx
+import pytest
+
+import server
+from storage.memory import MemoryStorage
+
+START = datetime(2026, 4, 1, 9, 0)
+EMAILS = [f"user{i}@example.com" for i in range(7)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # A storage of our own, so other tests' signups don't show up
+    storage = MemoryStorage()
+    monkeypatch.setattr(server, "storage", storage)
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 2)
+
+    def run(fn):
+        async def with_client():
+            await server.app.router.startup()
+            try:
+                for i, email in enumerate(EMAILS):
+                    created = START + timedelta(minutes=i)
+                    await storage.upsert_notify_emails({email: (created, created + timedelta(seconds=30))})
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+                    await fn(c)
+            finally:
+                await server.app.router.shutdown()
+        asyncio.run(with_client())
+    return run
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_pages_continue_after_cursor(client, monkeypatch, fast):
+    monkeypatch.setattr(server, "FAST_SERIALIZATION", fast)
+
+    async def run(c):
+        seen, after, pages = [], None, 0
+        while True:
+            r = await c.get("/api/admin/emails", params={"limit": 3, **({"after": after} if after else {})})
+            assert r.status_code == 200
+            seen += [item["email"] for item in r.json()]
+            pages += 1
+            after = r.headers.get("x-next-cursor")
+            if not after:
+                break
+        assert seen == EMAILS
+        assert pages == 3
+        first = (await c.get("/api/admin/emails", params={"limit": 1})).json()[0]
+        assert first["created_at"].startswith("2026-04-01T09:00:00")
+
+    client(run)
+
+
+def test_csv_export(client):
+    async def run(c):
+        r = await c.get("/api/admin/emails", params={"format": "csv"})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/csv")
+        assert r.headers["content-disposition"] == 'attachment; filename="emails.csv"'
+        rows = list(csv.reader(io.StringIO(r.text)))
+        assert rows[0] == ["email", "created_at", "updated_at"]
+        assert [row[0] for row in rows[1:]] == EMAILS
+        assert rows[1][1:] == ["2026-04-01T09:00:00", "2026-04-01T09:00:30"]
+
+    client(run)
+
+
+def test_ndjson_export_after_cursor(client):
+    async def run(c):
+        page = await c.get("/api/admin/emails", params={"limit": 2})
+        after = page.headers["x-next-cursor"]
+        r = await c.get("/api/admin/emails", params={"format": "ndjson", "after": after})
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert [line["email"] for line in lines] == EMAILS[2:]
+        assert set(lines[0]) == {"email", "created_at", "updated_at"}
+
+    client(run)
+
+
+@pytest.mark.parametrize("params", [{}, {"format": "csv"}])
+def test_invalid_cursor(client, params):
+    async def run(c):
+        r = await c.get("/api/admin/emails", params={"after": "not-a-cursor", **params})
+        assert r.status_code == 400
+
+    client(run)
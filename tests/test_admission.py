@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from admission import BULK, DEFAULT, AdaptiveLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_admits_up_to_limit_then_sheds():
+    async def run():
+        limiter = AdaptiveLimiter(initial=2, min_limit=1, max_wait=0)
+        assert await limiter.acquire(DEFAULT)
+        assert await limiter.acquire(DEFAULT)
+        assert not await limiter.acquire(DEFAULT)
+        limiter.release(DEFAULT)
+        assert await limiter.acquire(DEFAULT)
+
+    asyncio.run(run())
+
+
+def test_bulk_only_gets_its_share():
+    async def run():
+        limiter = AdaptiveLimiter(initial=4, min_limit=1, bulk_share=0.5, max_wait=0)
+        assert await limiter.acquire(BULK)
+        assert await limiter.acquire(BULK)
+        assert not await limiter.acquire(BULK)
+        assert await limiter.acquire(DEFAULT)
+        assert await limiter.acquire(DEFAULT)
+        assert not await limiter.acquire(DEFAULT)
+        assert limiter.in_flight == {DEFAULT: 2, BULK: 2}
+
+    asyncio.run(run())
+
+
+def test_queue_is_bounded_and_waits_time_out():
+    async def run():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_queue=1, max_wait=0.05)
+        assert await limiter.acquire(DEFAULT)
+        waiting = asyncio.create_task(limiter.acquire(DEFAULT))
+        await asyncio.sleep(0)
+        # Queue full: rejected without waiting
+        assert not await limiter.acquire(DEFAULT)
+        assert not await waiting
+        assert not limiter._waiters[DEFAULT]
+        assert limiter.in_flight[DEFAULT] == 1
+
+    asyncio.run(run())
+
+
+def test_freed_slots_go_to_default_before_bulk():
+    async def run():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, bulk_share=1, max_wait=1)
+        assert await limiter.acquire(DEFAULT)
+        bulk = asyncio.create_task(limiter.acquire(BULK))
+        await asyncio.sleep(0)
+        default = asyncio.create_task(limiter.acquire(DEFAULT))
+        await asyncio.sleep(0)
+
+        limiter.release(DEFAULT)
+        assert await default
+        assert not bulk.done()
+        assert limiter.in_flight == {DEFAULT: 1, BULK: 0}
+        limiter.release(DEFAULT)
+        assert await bulk
+        assert limiter.in_flight == {DEFAULT: 0, BULK: 1}
+
+    asyncio.run(run())
+
+
+def test_new_arrivals_do_not_jump_the_queue():
+    async def run():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_wait=1)
+        assert await limiter.acquire(DEFAULT)
+        first = asyncio.create_task(limiter.acquire(DEFAULT))
+        await asyncio.sleep(0)
+        limiter.limit = 2
+        # A slot is free, but a default request is already waiting for it
+        late = asyncio.create_task(limiter.acquire(DEFAULT))
+        await asyncio.sleep(0)
+        assert not late.done()
+        limiter.release(DEFAULT)
+        assert await first and await late
+
+    asyncio.run(run())
+
+
+def test_cancelled_after_admission_passes_the_slot_on():
+    async def run():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_wait=1)
+        assert await limiter.acquire(DEFAULT)
+        cancelled = asyncio.create_task(limiter.acquire(DEFAULT))
+        await asyncio.sleep(0)
+        other = asyncio.create_task(limiter.acquire(DEFAULT))
+        await asyncio.sleep(0)
+
+        # The caller goes away, and before it resumes release() admits it
+        cancelled.cancel()
+        limiter.release(DEFAULT)
+        assert limiter.in_flight[DEFAULT] == 1
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert await other
+        assert limiter.in_flight[DEFAULT] == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_while_waiting_leaves_the_queue():
+    async def run():
+        limiter = AdaptiveLimiter(initial=1, min_limit=1, max_wait=1)
+        assert await limiter.acquire(DEFAULT)
+        waiting = asyncio.create_task(limiter.acquire(DEFAULT))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert not limiter._waiters[DEFAULT]
+        limiter.release(DEFAULT)
+        assert limiter.in_flight[DEFAULT] == 0
+
+    asyncio.run(run())
+
+
+def test_limit_backs_off_on_slow_storage_and_grows_when_saturated():
+    async def run():
+        clock = Clock()
+        limiter = AdaptiveLimiter(initial=10, min_limit=5, max_limit=11, target_latency=0.1,
+                                  backoff=0.5, window=1, max_wait=0, clock=clock)
+
+        # Slow DB calls: multiplicative decrease, once per window
+        assert await limiter.acquire(DEFAULT)
+        clock.now = 1
+        limiter.release(DEFAULT, db_seconds=0.6, db_calls=2)
+        assert limiter.limit == 5
+        assert await limiter.acquire(DEFAULT)
+        clock.now = 1.5
+        limiter.release(DEFAULT, db_seconds=1, db_calls=1)
+        assert limiter.limit == 5
+        assert await limiter.acquire(DEFAULT)
+        clock.now = 2
+        limiter.release(DEFAULT)
+        # ...never below min_limit
+        assert limiter.limit == 5
+
+        # Fast and not saturated: unchanged
+        assert await limiter.acquire(DEFAULT)
+        clock.now = 3
+        limiter.release(DEFAULT, db_seconds=0.01, db_calls=1)
+        assert limiter.limit == 5
+
+        # Fast and saturated: additive increase, up to max_limit
+        limiter.limit = 10
+        for expected in (11, 11):
+            held = [await limiter.acquire(DEFAULT) for _ in range(int(limiter.limit))]
+            assert all(held) and not await limiter.acquire(DEFAULT)
+            clock.now += 1
+            for _ in held:
+                limiter.release(DEFAULT, db_seconds=0.01, db_calls=1)
+            assert limiter.limit == expected
+
+    asyncio.run(run())
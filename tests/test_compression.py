@@ -0,0 +1,167 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import compression
+from compression import CompressionMiddleware, choose_encoding
+
+BODY = b'{"items": "' + b"palette " * 400 + b'"}'
+ETAG = '"v1"'
+
+
+async def json_body(request):
+    return Response(BODY, media_type="application/json")
+
+
+async def small(request):
+    return Response(b'{"ok": true}', media_type="application/json")
+
+
+async def versioned(request):
+    # Weak comparison, as the palette routes do
+    tags = [t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")]
+    if ETAG in tags:
+        return Response(status_code=304, headers={"ETag": ETAG})
+    return Response(BODY, media_type="application/json", headers={"ETag": ETAG})
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(3):
+            yield f"row {i}\n".encode() * 200
+    return StreamingResponse(chunks(), media_type="text/csv")
+
+
+async def events(request):
+    async def chunks():
+        yield b"event: palettes\ndata: " + BODY + b"\n\n"
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+async def encoded(request):
+    return Response(gzip.compress(BODY), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+
+app = CompressionMiddleware(Starlette(routes=[
+    Route("/json", json_body), Route("/small", small), Route("/versioned", versioned),
+    Route("/stream", stream), Route("/events", events), Route("/encoded", encoded),
+]), minimum_size=1024)
+
+
+def request(path, **headers):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("accept,expected", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("BR;q=0.0, gzip;q=0", None),
+    ("br;q=0.5", "br"),
+    ("*", "br"),
+    ("deflate", None),
+])
+def test_choose_encoding(accept, expected):
+    assert choose_encoding(accept, ("br", "gzip")) == expected
+
+
+def test_choose_encoding_without_brotli():
+    assert choose_encoding("br, gzip", ("gzip",)) == "gzip"
+    assert choose_encoding("br", ("gzip",)) is None
+
+
+def test_compresses_negotiated_responses():
+    r = request("/json", **{"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert int(r.headers["content-length"]) < len(BODY)
+    assert r.content == BODY
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli not installed")
+def test_prefers_brotli():
+    r = request("/json", **{"Accept-Encoding": "gzip, br"})
+    assert r.headers["content-encoding"] == "br"
+    assert r.content == BODY
+
+
+@pytest.mark.parametrize("path,accept", [
+    ("/json", "identity"),
+    ("/json", "gzip;q=0"),
+    ("/small", "gzip"),
+])
+def test_identity(path, accept):
+    r = request(path, **{"Accept-Encoding": accept})
+    assert "content-encoding" not in r.headers
+    assert "vary" not in r.headers
+
+
+def test_streams_chunk_by_chunk():
+    r = request("/stream", **{"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "content-length" not in r.headers
+    assert r.text == "".join(f"row {i}\n" * 200 for i in range(3))
+
+
+def test_event_streams_pass_through():
+    r = request("/events", **{"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+    assert r.content.startswith(b"event: palettes")
+
+
+def test_already_encoded_responses_pass_through():
+    r = request("/encoded", **{"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    # Decoded once by the client, so it was not compressed twice
+    assert r.content == BODY
+
+
+def test_versioned_bodies_are_compressed_once(monkeypatch):
+    calls = []
+    real = compression.compress
+
+    def counting(body, encoding, level=None):
+        calls.append((encoding, level))
+        return real(body, encoding, level)
+    monkeypatch.setattr(compression, "compress", counting)
+    app._cache.clear()
+
+    first = request("/versioned", **{"Accept-Encoding": "gzip"})
+    second = request("/versioned", **{"Accept-Encoding": "gzip"})
+    assert first.content == second.content == BODY
+    # Maximum level, keyed by the original ETag
+    assert calls == [("gzip", None)]
+    assert list(app._cache) == [(ETAG, "gzip")]
+
+    request("/json", **{"Accept-Encoding": "gzip"})
+    assert calls[-1] == ("gzip", compression.DYNAMIC_LEVELS["gzip"])
+    assert len(app._cache) == 1
+
+
+def test_cache_is_bounded():
+    middleware = CompressionMiddleware(None, cache_size=2)
+    for etag in ('"a"', '"b"', '"a"', '"c"'):
+        middleware._cached(etag, "gzip", BODY)
+    assert list(middleware._cache) == [('"a"', "gzip"), ('"c"', "gzip")]
+
+
+def test_weakened_etag_revalidates():
+    r = request("/versioned", **{"Accept-Encoding": "gzip"})
+    assert r.headers["etag"] == "W/" + ETAG
+    r = request("/versioned", **{"Accept-Encoding": "gzip", "If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+    assert "content-encoding" not in r.headers
+    # Uncompressed responses keep the strong tag
+    assert request("/versioned", **{"Accept-Encoding": "identity"}).headers["etag"] == ETAG
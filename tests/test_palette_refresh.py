@@ -0,0 +1,36 @@
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("NOTIFY_SPOOL_DIR", tempfile.mkdtemp())
+
+import server
+
+
+def test_change_event_reads_primary_and_beats_a_lagging_read(monkeypatch):
+    old = [p.model_dump() for p in server.CURATED_PALETTES]
+    new = [dict(old[0], name="Renamed")] + old[1:]
+    reads = []
+
+    async def list_palettes(primary=False):
+        reads.append(primary)
+        if primary:
+            return new
+        # A secondary that hasn't applied the change, answering slowly
+        await asyncio.sleep(0.1)
+        return old
+
+    async def run():
+        server.palette_cache.load(old)
+        monkeypatch.setattr(server.storage.inner, "list_palettes", list_palettes)
+        poll = asyncio.create_task(server.refresh_palette_cache())
+        await asyncio.sleep(0)
+        server._on_palette_change({})
+        await poll
+        await asyncio.sleep(0)
+        assert reads == [False, True]
+        assert server.palette_cache.items[0]["name"] == "Renamed"
+
+    asyncio.run(run())
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("NOTIFY_SPOOL_DIR", tempfile.mkdtemp())
+
+import httpx
+
+import server
+
+
+async def _with_client(fn):
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await fn(client)
+    finally:
+        await server.app.router.shutdown()
+
+
+def _recoloured_palettes():
+    items = [p.model_dump() for p in server.CURATED_PALETTES]
+    items[0]["accent"] = "#123456"
+    return items
+
+
+# ----------------------
+# CSS
+# ----------------------
+def test_css_etag_per_encoding():
+    async def run(client):
+        plain = await client.get("/api/palettes.css", headers={"Accept-Encoding": "identity"})
+        gzipped = await client.get("/api/palettes.css", headers={"Accept-Encoding": "gzip"})
+        assert plain.status_code == gzipped.status_code == 200
+        assert plain.headers["content-type"].startswith("text/css")
+        assert "content-encoding" not in plain.headers
+        assert gzipped.headers["content-encoding"] == "gzip"
+        assert plain.headers["etag"] != gzipped.headers["etag"]
+        assert plain.content == gzipped.content
+        assert plain.headers["vary"] == "Accept-Encoding"
+        # Either tag names the same content
+        for etag in (plain.headers["etag"], gzipped.headers["etag"]):
+            r = await client.get("/api/palettes.css", headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+            assert r.status_code == 304
+            assert r.content == b""
+
+    asyncio.run(_with_client(run))
+
+
+def test_css_hashed_urls():
+    async def run(client):
+        for path in ("/api/palettes.css", f"/api/palettes/{server.CURATED_PALETTES[1].id}.css"):
+            r = await client.get(path)
+            location = r.headers["content-location"]
+            assert "immutable" not in r.headers["cache-control"]
+
+            hashed = await client.get(location)
+            assert hashed.status_code == 200
+            assert hashed.content == r.content
+            assert hashed.headers["cache-control"] == server.IMMUTABLE_CACHE_CONTROL
+            assert "immutable" in hashed.headers["cache-control"]
+
+            stale = await client.get(location.replace(".css", "0.css"))
+            assert stale.status_code == 302
+            assert stale.headers["location"] == location
+            assert stale.headers["cache-control"] == "no-cache"
+
+    asyncio.run(_with_client(run))
+
+
+def test_css_unknown_palette():
+    async def run(client):
+        assert (await client.get("/api/palettes/nope.css")).status_code == 404
+        assert (await client.get("/api/palettes/nope.0123456789abcdef.css")).status_code == 404
+
+    asyncio.run(_with_client(run))
+
+
+def test_css_rebuilt_only_when_palettes_change():
+    async def run(client):
+        css, css_by_id = server.palette_cache.css, server.palette_cache.css_by_id
+        old_location = (await client.get("/api/palettes.css")).headers["content-location"]
+
+        assert not server.palette_cache.load([p.model_dump() for p in server.CURATED_PALETTES])
+        assert server.palette_cache.css is css and server.palette_cache.css_by_id is css_by_id
+
+        assert server.palette_cache.load(_recoloured_palettes())
+        assert server.palette_cache.css is not css
+        r = await client.get("/api/palettes.css")
+        assert r.headers["content-location"] != old_location
+        assert b"#123456" in r.content
+        moved = await client.get(old_location)
+        assert moved.status_code == 302
+        assert moved.headers["location"] == r.headers["content-location"]
+
+    asyncio.run(_with_client(run))
+
+
+# ----------------------
+# JSON
+# ----------------------
+def test_palettes_revalidate_until_refreshed(monkeypatch):
+    async def run(client):
+        r = await client.get("/api/palettes", headers={"Accept-Encoding": "identity"})
+        etag = r.headers["etag"]
+        assert r.status_code == 200 and not etag.startswith("W/")
+        assert [p["id"] for p in r.json()] == [p.id for p in server.CURATED_PALETTES]
+
+        for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            r = await client.get("/api/palettes", headers={"If-None-Match": header})
+            assert r.status_code == 304
+            assert r.headers["etag"] == etag
+        assert (await client.get("/api/palettes", headers={"If-None-Match": '"other"'})).status_code == 200
+
+        # An unchanged reload keeps the tag
+        await server.refresh_palette_cache()
+        assert (await client.get("/api/palettes", headers={"If-None-Match": etag})).status_code == 304
+
+        async def recoloured(primary=False):
+            return _recoloured_palettes()
+        monkeypatch.setattr(server.storage.inner, "list_palettes", recoloured)
+        await server.refresh_palette_cache()
+        r = await client.get("/api/palettes", headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+        assert r.status_code == 200
+        assert r.headers["etag"] != etag
+        assert r.json()[0]["accent"] == "#123456"
+
+    asyncio.run(_with_client(run))
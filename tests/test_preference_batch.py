@@ -0,0 +1,94 @@
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("NOTIFY_SPOOL_DIR", tempfile.mkdtemp())
+
+import httpx
+
+import server
+
+
+async def _with_client(fn):
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await fn(client)
+    finally:
+        await server.app.router.shutdown()
+
+
+def test_batch_set_then_get_in_request_order():
+    async def run(client):
+        r = await client.post("/api/preferences/batch-set", json={"items": [
+            {"session_id": "batch-b", "palette_id": "mint"},
+            {"session_id": "batch-a", "palette_id": "sand"},
+            {"palette_id": "arctic"},
+        ]})
+        assert r.status_code == 200
+        items = r.json()
+        assert [i["palette_id"] for i in items] == ["mint", "sand", "arctic"]
+        assert [i["session_id"] for i in items[:2]] == ["batch-b", "batch-a"]
+        new_session = items[2]["session_id"]
+        assert new_session
+
+        # One cached, the rest read from storage
+        server.preference_cache.clear()
+        await client.get("/api/preferences", params={"session_id": "batch-a"})
+        r = await client.post("/api/preferences/batch-get", json={
+            "session_ids": [new_session, "batch-none", "batch-a", "batch-b", "batch-gone", "batch-a"],
+        })
+        assert r.status_code == 200
+        body = r.json()
+        assert [(i["session_id"], i["palette_id"]) for i in body["items"]] == [
+            (new_session, "arctic"), ("batch-a", "sand"), ("batch-b", "mint"), ("batch-a", "sand"),
+        ]
+        assert body["missing"] == ["batch-none", "batch-gone"]
+
+    asyncio.run(_with_client(run))
+
+
+def test_batch_set_duplicate_session_keeps_last_palette():
+    async def run(client):
+        r = await client.post("/api/preferences/batch-set", json={"items": [
+            {"session_id": "batch-dup", "palette_id": "mint"},
+            {"session_id": "batch-dup", "palette_id": "sand"},
+        ]})
+        assert [i["palette_id"] for i in r.json()] == ["sand", "sand"]
+        assert (await server.storage.get_preference("batch-dup"))["palette_id"] == "sand"
+        r = await client.get("/api/preferences", params={"session_id": "batch-dup"})
+        assert r.json()["palette_id"] == "sand"
+
+    asyncio.run(_with_client(run))
+
+
+def test_batch_set_unknown_palettes():
+    async def run(client):
+        r = await client.post("/api/preferences/batch-set", json={"items": [
+            {"session_id": "batch-u1", "palette_id": "zz-top"},
+            {"session_id": "batch-u2", "palette_id": "mint"},
+            {"session_id": "batch-u3", "palette_id": "aa-none"},
+        ]})
+        assert r.status_code == 404
+        assert r.json()["detail"] == "Palette not found: aa-none, zz-top"
+        # Nothing from the batch was written
+        assert await server.storage.get_preference("batch-u2") is None
+
+    asyncio.run(_with_client(run))
+
+
+def test_batch_size_limit(monkeypatch):
+    monkeypatch.setattr(server, "PREFERENCE_BATCH_MAX", 2)
+
+    async def run(client):
+        r = await client.post("/api/preferences/batch-get", json={"session_ids": ["a", "b", "c"]})
+        assert r.status_code == 413
+        r = await client.post("/api/preferences/batch-set", json={"items": [{"palette_id": "mint"}] * 3})
+        assert r.status_code == 413
+        r = await client.post("/api/preferences/batch-get", json={"session_ids": ["a", "b"]})
+        assert r.status_code == 200
+
+    asyncio.run(_with_client(run))
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("NOTIFY_SPOOL_DIR", tempfile.mkdtemp())
+
+import httpx
+import pytest
+
+import server
+from cache import WriteGenerations
+
+
+def test_write_generations():
+    writes = WriteGenerations()
+    token = writes.begin("a")
+    writes.bump("b")
+    assert writes.end("a", token)
+    token = writes.begin("a")
+    writes.bump("a")
+    assert not writes.end("a", token)
+    token = writes.begin("a")
+    writes.bump_all()
+    assert not writes.end("a", token)
+    # Nothing is tracked without reads in flight
+    writes.bump("a")
+    assert writes.end("a", writes.begin("a"))
+
+
+@pytest.fixture
+def slow_reads(monkeypatch):
+    inner = server.storage.inner
+
+    def slow(name):
+        fn = getattr(inner, name)
+
+        async def call(*args):
+            result = await fn(*args)
+            # The read has its (soon stale) answer; the write lands meanwhile
+            await asyncio.sleep(0.2)
+            return result
+        call.__name__ = name
+        monkeypatch.setattr(inner, name, call)
+
+    slow("get_preference")
+    slow("get_preferences")
+
+
+async def _with_client(fn):
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await fn(client)
+    finally:
+        await server.app.router.shutdown()
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_write_during_read_is_not_overwritten(slow_reads, batch):
+    session_id = f"race-{batch}"
+
+    async def read(client):
+        if batch:
+            r = await client.post("/api/preferences/batch-get", json={"session_ids": [session_id]})
+            return r.json()["items"][0]["palette_id"]
+        r = await client.get("/api/preferences", params={"session_id": session_id})
+        return r.json()["palette_id"]
+
+    async def run(client):
+        r = await client.post("/api/preferences", json={"session_id": session_id, "palette_id": "mint"})
+        assert r.status_code == 200
+        server.preference_cache.clear()
+        stale = asyncio.create_task(read(client))
+        await asyncio.sleep(0.05)
+        r = await client.post("/api/preferences", json={"session_id": session_id, "palette_id": "sand"})
+        assert r.status_code == 200
+        # Started before the write, so it may answer with the old palette...
+        assert await stale == "mint"
+        # ...but must not leave it in the cache for later readers
+        assert await read(client) == "sand"
+        assert server.preference_cache.get(session_id)["palette_id"] == "sand"
+
+    asyncio.run(_with_client(run))
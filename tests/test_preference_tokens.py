@@ -0,0 +1,95 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("NOTIFY_SPOOL_DIR", tempfile.mkdtemp())
+
+import httpx
+import jwt
+
+import server
+from preference_tokens import PreferenceTokens
+
+SECRET = "preference-token-test-secret-0123"
+OTHER_SECRET = "another-preference-token-secret-4567"
+VALUE = {"session_id": "s1", "palette_id": "mint", "updated_at": datetime(2026, 5, 1, 12, 30, 15, 250000)}
+
+
+def test_round_trip():
+    tokens = PreferenceTokens(SECRET)
+    assert tokens.verify(tokens.issue(VALUE), "s1") == VALUE
+
+
+def test_rejects_other_sessions():
+    tokens = PreferenceTokens(SECRET)
+    assert tokens.verify(tokens.issue(VALUE), "s2") is None
+
+
+def test_rejects_expired():
+    tokens = PreferenceTokens(SECRET, ttl=-1)
+    assert tokens.verify(tokens.issue(VALUE), "s1") is None
+
+
+def test_rejects_tampering():
+    tokens = PreferenceTokens(SECRET)
+    header, payload, signature = tokens.issue(VALUE).split(".")
+    flipped = signature[:5] + ("A" if signature[5] != "A" else "B") + signature[6:]
+    assert tokens.verify(".".join([header, payload, flipped]), "s1") is None
+
+    # A palette swapped in under a different key
+    forged = PreferenceTokens(OTHER_SECRET).issue(dict(VALUE, palette_id="sand"))
+    assert tokens.verify(forged, "s1") is None
+    assert tokens.verify(header + "." + forged.split(".")[1] + "." + signature, "s1") is None
+
+    unsigned = jwt.encode({"sid": "s1", "pid": "sand", "upd": 0, "exp": 2 ** 40}, None, algorithm="none")
+    assert tokens.verify(unsigned, "s1") is None
+    assert tokens.verify("not a token", "s1") is None
+
+
+def test_requires_all_claims():
+    token = jwt.encode({"sid": "s1", "pid": "mint", "exp": 2 ** 40}, SECRET, algorithm="HS256")
+    assert PreferenceTokens(SECRET).verify(token, "s1") is None
+
+
+def test_get_preference_falls_back_to_storage(monkeypatch):
+    monkeypatch.setattr(server, "preference_tokens", PreferenceTokens(SECRET))
+
+    async def run(client):
+        r = await client.post("/api/preferences", json={"session_id": "tok-a", "palette_id": "mint"})
+        token = r.json()["token"]
+        await client.post("/api/preferences", json={"session_id": "tok-b", "palette_id": "sand"})
+        # Changed behind the token's back: only lookups see it
+        await server.storage.upsert_preference("tok-a", "arctic", datetime.utcnow())
+        server.preference_cache.clear()
+
+        async def get(session_id, token):
+            r = await client.get("/api/preferences", params={"session_id": session_id, "token": token})
+            assert r.status_code == 200
+            return r.json()
+
+        body = await get("tok-a", token)
+        assert body["palette_id"] == "mint"
+        assert body["token"] == token
+
+        # Tampered, or another session's token: the normal lookup answers
+        body = await get("tok-a", token[:-4] + "AAAA")
+        assert body["palette_id"] == "arctic"
+        assert body["token"] != token
+        assert (await get("tok-b", token))["palette_id"] == "sand"
+
+        r = await client.get("/api/preferences", params={"session_id": "tok-missing", "token": token})
+        assert r.status_code == 404
+
+    async def with_client():
+        await server.app.router.startup()
+        try:
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await run(client)
+        finally:
+            await server.app.router.shutdown()
+
+    asyncio.run(with_client())
@@ -0,0 +1,51 @@
+import asyncio
+
+from rate_limit import MemoryBackend, Quota
+
+
+class Clock:
+    def __init__(self, now: int = 4085 * 1_000_000_000 + 123_456_789):
+        self.now = now
+
+    def __call__(self) -> int:
+        return self.now
+
+
+def hit(backend, *checks):
+    return asyncio.run(backend.hit(list(checks)))
+
+
+def test_first_hit_is_allowed():
+    backend = MemoryBackend(clock=Clock())
+    for i in range(100):
+        assert hit(backend, (f"email:{i}", Quota.parse("1/min")), (f"ip:{i}", Quota.parse("1/min"))).allowed
+
+
+def test_burst_of_exactly_limit_is_allowed():
+    for spec, limit in (("7/min", 7), ("3/10", 3), ("1/min", 1), ("5/3600", 5)):
+        backend = MemoryBackend(clock=Clock())
+        quota = Quota.parse(spec)
+        assert all(hit(backend, ("k", quota)).allowed for _ in range(limit)), spec
+        denied = hit(backend, ("k", quota))
+        assert not denied.allowed and denied.denied_keys == ("k",)
+        assert denied.retry_after >= 1
+
+
+def test_slot_frees_after_interval():
+    clock = Clock()
+    backend = MemoryBackend(clock=clock)
+    quota = Quota.parse("3/10")
+    for _ in range(3):
+        assert hit(backend, ("k", quota)).allowed
+    assert not hit(backend, ("k", quota)).allowed
+    clock.now += 10 * 1_000_000_000 // 3
+    assert hit(backend, ("k", quota)).allowed
+    assert not hit(backend, ("k", quota)).allowed
+
+
+def test_denied_request_consumes_nothing():
+    backend = MemoryBackend(clock=Clock())
+    quota = Quota.parse("1/min")
+    assert hit(backend, ("ip", quota)).allowed
+    assert not hit(backend, ("email", quota), ("ip", quota)).allowed
+    assert hit(backend, ("email", quota)).allowed
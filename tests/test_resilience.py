@@ -0,0 +1,233 @@
+import asyncio
+import contextlib
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from degraded import NotifySpool, PreferenceRetryBuffer
+from storage import CircuitBreaker, ResilientStorage, Storage, StorageUnavailable
+from storage.memory import MemoryStorage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# ----------------------
+# Circuit breaker
+# ----------------------
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=Clock())
+    breaker.failure()
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    breaker.failure()
+    assert breaker.allow() and not breaker.is_open
+    breaker.failure()
+    assert breaker.is_open and not breaker.allow()
+
+
+def test_breaker_half_open_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.failure()
+    clock.now = 9.9
+    assert not breaker.allow()
+    clock.now = 10
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_breaker_failed_probe_reopens():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=10, clock=clock)
+    for _ in range(5):
+        breaker.failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now = 19.9
+    assert not breaker.allow()
+    clock.now = 20
+    assert breaker.allow()
+
+
+def test_breaker_abandoned_probe_frees_the_slot():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1, clock=clock)
+    breaker.failure()
+    clock.now = 1
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow()
+
+
+# ----------------------
+# ResilientStorage
+# ----------------------
+class FlakyStorage(Storage):
+    transient_errors = (ConnectionError,)
+
+    def __init__(self):
+        self.delay = 0.0
+        self.error = None
+        self.deadlines = []
+
+    @contextlib.contextmanager
+    def deadline(self, seconds):
+        self.deadlines.append(seconds)
+        yield
+
+    async def list_palettes(self, primary=False):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return []
+
+
+def test_deadline_and_breaker():
+    async def run():
+        inner = FlakyStorage()
+        storage = ResilientStorage(inner, CircuitBreaker(failure_threshold=2, reset_timeout=60), read_timeout=0.05)
+        assert await storage.list_palettes() == []
+        assert inner.deadlines == [0.05]
+
+        inner.delay = 1
+        with pytest.raises(StorageUnavailable):
+            await storage.list_palettes()
+        inner.delay, inner.error = 0, ConnectionError("reset")
+        with pytest.raises(StorageUnavailable):
+            await storage.list_palettes()
+        assert storage.breaker.is_open
+
+        # Open: fails fast without calling the backend
+        inner.error = None
+        calls = len(inner.deadlines)
+        with pytest.raises(StorageUnavailable):
+            await storage.list_palettes()
+        assert len(inner.deadlines) == calls
+
+    asyncio.run(run())
+
+
+def test_non_transient_errors_pass_through_and_count_as_success():
+    async def run():
+        inner = FlakyStorage()
+        storage = ResilientStorage(inner, CircuitBreaker(failure_threshold=1))
+        inner.error = ValueError("bad cursor")
+        with pytest.raises(ValueError):
+            await storage.list_palettes()
+        assert not storage.breaker.is_open
+
+    asyncio.run(run())
+
+
+# ----------------------
+# Degraded-mode buffers
+# ----------------------
+class DownStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.down = True
+
+    async def upsert_preferences(self, palette_ids, now):
+        if self.down:
+            raise StorageUnavailable("down")
+        await super().upsert_preferences(palette_ids, now)
+
+    async def upsert_notify_emails(self, emails):
+        if self.down:
+            raise StorageUnavailable("down")
+        await super().upsert_notify_emails(emails)
+
+
+def test_preference_buffer_is_bounded_and_replays():
+    async def run():
+        buffer = PreferenceRetryBuffer(maxsize=2)
+        t1, t2 = datetime(2026, 1, 1), datetime(2026, 1, 2)
+        assert buffer.add({"a": "mint"}, t1)
+        assert buffer.add({"a": "sand", "b": "mint"}, t2)
+        # All or nothing: "c" does not fit, so "a" is not touched either
+        assert not buffer.add({"a": "charcoal", "c": "mint"}, t2)
+        assert buffer.get("a")["palette_id"] == "sand"
+
+        storage = DownStorage()
+        with pytest.raises(StorageUnavailable):
+            await buffer.replay(storage)
+        assert len(buffer) == 2
+
+        storage.down = False
+        assert await buffer.replay(storage) == 2
+        assert len(buffer) == 0
+        assert (await storage.get_preference("a"))["palette_id"] == "sand"
+        assert await buffer.replay(storage) == 0
+
+    asyncio.run(run())
+
+
+def test_notify_spool_replays_and_survives_failures(tmp_path):
+    async def run():
+        spool = NotifySpool(str(tmp_path))
+        assert not spool.pending()
+        t1, t2 = datetime(2026, 1, 1), datetime(2026, 1, 2)
+        assert await spool.append({"a@x.io": (t1, t1)})
+        assert await spool.append({"a@x.io": (t2, t2), "b@x.io": (t2, t2)})
+        assert spool.pending()
+
+        storage = DownStorage()
+        with pytest.raises(StorageUnavailable):
+            await spool.replay(storage)
+        # Signups arriving after a failed replay are kept too
+        assert await spool.append({"c@x.io": (t2, t2)})
+        assert spool.pending()
+
+        storage.down = False
+        assert await spool.replay(storage) == 2
+        assert await spool.replay(storage) == 1
+        assert not spool.pending() and os.listdir(tmp_path) == []
+        emails = {e["email"]: e for e in (await storage.page_notify_emails(None, 10))[0]}
+        assert (emails["a@x.io"]["created_at"], emails["a@x.io"]["updated_at"]) == (t1, t2)
+        assert set(emails) == {"a@x.io", "b@x.io", "c@x.io"}
+
+    asyncio.run(run())
+
+
+def test_notify_spool_is_bounded(tmp_path):
+    async def run():
+        spool = NotifySpool(str(tmp_path), max_bytes=10)
+        now = datetime(2026, 1, 1)
+        assert await spool.append({"a@x.io": (now, now)})
+        assert not await spool.append({"b@x.io": (now, now)})
+
+    asyncio.run(run())
+
+
+def test_notify_spool_picks_up_orphans(tmp_path):
+    async def run():
+        # Beyond pid_max, so never a live process
+        dead_pid = 2 ** 22 + 1
+        line = {"email": "o@x.io", "first": "2026-01-01T00:00:00", "last": "2026-01-02T00:00:00"}
+        (tmp_path / f"notify-{dead_pid}.jsonl").write_text(json.dumps(line) + "\n")
+        (tmp_path / f"notify-{dead_pid}.jsonl.replaying").write_text('{"email": "torn')
+        (tmp_path / f"notify-{os.getpid()}x.jsonl").write_text("not ours")
+
+        spool = NotifySpool(str(tmp_path))
+        assert spool.pending()
+        storage = MemoryStorage()
+        assert await spool.replay(storage) == 1
+        assert [e["email"] for e in (await storage.page_notify_emails(None, 10))[0]] == ["o@x.io"]
+        assert os.listdir(tmp_path) == [f"notify-{os.getpid()}x.jsonl"]
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+import asyncio
+import base64
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("NOTIFY_SPOOL_DIR", tempfile.mkdtemp())
+
+import httpx
+import pytest
+
+import server
+
+START = datetime(2026, 2, 1, 8, 0)
+# Three checks share each of the first two timestamps
+DOCS = [
+    {"id": f"page-{n}", "client_name": "pager", "timestamp": START + timedelta(seconds=offset)}
+    for n, offset in zip("gbedacf", [0, 0, 0, 5, 5, 5, 9])
+]
+ASCENDING = [d["id"] for d in sorted(DOCS, key=lambda d: (d["timestamp"], d["id"]))]
+
+
+async def _with_client(fn):
+    await server.app.router.startup()
+    try:
+        if not await server.storage.find_status_checks("pager", None, None, None, False, 1):
+            await server.storage.insert_status_checks(DOCS)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await fn(client)
+    finally:
+        await server.app.router.shutdown()
+
+
+async def _all_pages(client, **params):
+    ids, pages, after = [], 0, None
+    while True:
+        query = dict(params, client_name="pager")
+        if after:
+            query["after"] = after
+        r = await client.get("/api/status", params=query)
+        assert r.status_code == 200
+        ids += [doc["id"] for doc in r.json()]
+        pages += 1
+        after = r.headers.get("x-next-cursor")
+        if after is None:
+            return ids, pages
+
+
+@pytest.fixture(params=[True, False], ids=["fast", "pydantic"])
+def serialization(request, monkeypatch):
+    monkeypatch.setattr(server, "FAST_SERIALIZATION", request.param)
+
+
+@pytest.mark.parametrize("limit,pages", [(2, 4), (3, 3), (7, 1), (100, 1)])
+def test_pages_across_equal_timestamps(serialization, limit, pages):
+    async def run(client):
+        assert await _all_pages(client, limit=limit) == (ASCENDING, pages)
+        assert await _all_pages(client, limit=limit, order="desc") == (ASCENDING[::-1], pages)
+
+    asyncio.run(_with_client(run))
+
+
+def test_last_page_has_no_cursor(serialization):
+    async def run(client):
+        r = await client.get("/api/status", params={"client_name": "pager", "limit": 6})
+        assert len(r.json()) == 6 and "x-next-cursor" in r.headers
+        r = await client.get("/api/status", params={"client_name": "pager", "limit": 6,
+                                                    "after": r.headers["x-next-cursor"]})
+        assert [doc["id"] for doc in r.json()] == ASCENDING[6:]
+        assert "x-next-cursor" not in r.headers
+
+    asyncio.run(_with_client(run))
+
+
+@pytest.mark.parametrize("cursor", [
+    "%%%",
+    base64.urlsafe_b64encode(b"not-a-time|page-a").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_malformed_cursor(cursor):
+    async def run(client):
+        r = await client.get("/api/status", params={"client_name": "pager", "after": cursor})
+        assert r.status_code == 400
+        assert r.json()["detail"] == "Invalid cursor"
+
+    asyncio.run(_with_client(run))
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("NOTIFY_SPOOL_DIR", tempfile.mkdtemp())
+
+import httpx
+import pytest
+
+import server
+from storage import StorageUnavailable
+
+
+async def _with_client(fn):
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await fn(client)
+    finally:
+        await server.app.router.shutdown()
+
+
+def _minute_count(client_name):
+    return sum(
+        row["count"] for (granularity, name, _), row in server.storage.inner.status_rollups.items()
+        if granularity == "minute" and name == client_name
+    )
+
+
+@pytest.mark.parametrize("path,body", [
+    ("/api/status", {"client_name": "rollup-single"}),
+    ("/api/status/batch", [{"client_name": "rollup-batch"}, {"client_name": "rollup-batch"}]),
+])
+def test_rollups_follow_stored_checks(monkeypatch, path, body):
+    client_name = body["client_name"] if isinstance(body, dict) else body[0]["client_name"]
+    expected = 1 if isinstance(body, dict) else len(body)
+
+    async def failing_insert(docs):
+        raise StorageUnavailable("insert failed")
+
+    async def run(client):
+        with monkeypatch.context() as m:
+            m.setattr(server.storage.inner, "insert_status_checks", failing_insert)
+            r = await client.post(path, json=body)
+            assert r.status_code == 503
+        assert _minute_count(client_name) == 0
+
+        r = await client.post(path, json=body)
+        assert r.status_code == 200
+        assert _minute_count(client_name) == expected
+
+    asyncio.run(_with_client(run))
+
+
+def test_backfill_inside_buckets_rebuilds_them_whole(monkeypatch, storage_backend):
+    start = datetime(2026, 3, 1, 10, 0)
+    docs = [
+        {"id": f"edge-{i}", "client_name": "edge", "timestamp": start + timedelta(seconds=offset)}
+        for i, offset in enumerate([0, 50, 70, 95, 130, 3590, 3610, 3700, 7300])
+    ]
+
+    async def run():
+        monkeypatch.setattr(server, "storage", storage_backend)
+        await storage_backend.insert_status_checks(docs)
+        await server.record_status_rollups(docs)
+        # Both ends cut through a minute and an hour bucket
+        await server.backfill_status_rollups(start + timedelta(seconds=90), start + timedelta(seconds=3650))
+        for granularity in server.ROLLUP_GRANULARITIES:
+            raw = await storage_backend.aggregate_status_stats(granularity, None, None, None, 100)
+            assert await storage_backend.find_status_rollups(granularity, None, None, None, 100) == raw
+
+    asyncio.run(run())
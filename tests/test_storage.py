@@ -0,0 +1,164 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from storage import InvalidCursor
+
+T0 = datetime(2026, 6, 1, 12, 0, 0, 123456)
+PALETTES = [{"id": "b", "name": "B"}, {"id": "a", "name": "A"}]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_sqlite_uses_wal(tmp_path):
+    from storage.sqlite import SqliteStorage
+
+    storage = SqliteStorage(str(tmp_path / "wal.db"))
+    run(storage.migrate([]))
+    try:
+        conn = sqlite3.connect(storage.path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+    finally:
+        run(storage.close())
+
+
+def test_palettes_are_seeded_once(tmp_path):
+    from storage import create_storage
+
+    for kind in ("memory", "sqlite"):
+        storage = create_storage({"STORAGE_BACKEND": kind, "SQLITE_PATH": str(tmp_path / "seed.db")})
+
+        async def seed():
+            await storage.migrate(PALETTES)
+            await storage.migrate([{"id": "c", "name": "C"}])
+            return await storage.list_palettes()
+        try:
+            assert run(seed()) == PALETTES, kind
+        finally:
+            run(storage.close())
+
+
+def test_preferences(storage_backend):
+    async def go():
+        assert await storage_backend.get_preference("s1") is None
+        stored = await storage_backend.upsert_preference("s1", "mint", T0)
+        assert stored == {"session_id": "s1", "palette_id": "mint", "updated_at": T0}
+        later = T0 + timedelta(seconds=1)
+        await storage_backend.upsert_preference("s1", "sand", later)
+        assert await storage_backend.get_preference("s1") == {"session_id": "s1", "palette_id": "sand", "updated_at": later}
+
+        await storage_backend.upsert_preferences({"s2": "mint", "s3": "arctic"}, T0)
+        found = await storage_backend.get_preferences(["s3", "s1", "nobody", "s3"])
+        assert sorted((p["session_id"], p["palette_id"]) for p in found) == [("s1", "sand"), ("s3", "arctic")]
+        assert await storage_backend.get_preferences([]) == []
+    run(go())
+
+
+def test_notify_emails_keep_first_seen_and_page(storage_backend):
+    async def go():
+        for i in range(5):
+            await storage_backend.upsert_notify_emails({f"e{i}@x.io": (T0, T0)})
+        later = T0 + timedelta(hours=1)
+        await storage_backend.upsert_notify_emails({"e1@x.io": (later, later)})
+
+        items, cursor = await storage_backend.page_notify_emails(None, 2)
+        assert [e["email"] for e in items] == ["e0@x.io", "e1@x.io"]
+        assert (items[1]["created_at"], items[1]["updated_at"]) == (T0, later)
+        items, cursor = await storage_backend.page_notify_emails(cursor, 2)
+        assert [e["email"] for e in items] == ["e2@x.io", "e3@x.io"]
+        items, cursor = await storage_backend.page_notify_emails(cursor, 2)
+        assert [e["email"] for e in items] == ["e4@x.io"] and cursor is None
+
+        _, cursor = await storage_backend.page_notify_emails(None, 1)
+        batches = [[e["email"] for e in batch] async for batch in storage_backend.iter_notify_emails(cursor, 3)]
+        assert batches == [["e1@x.io", "e2@x.io", "e3@x.io"], ["e4@x.io"]]
+
+        with pytest.raises(InvalidCursor):
+            await storage_backend.page_notify_emails("bogus", 2)
+        with pytest.raises(InvalidCursor):
+            storage_backend.iter_notify_emails("bogus", 2)
+    run(go())
+
+
+def test_status_checks_keyset(storage_backend):
+    docs = [
+        {"id": i, "client_name": name, "timestamp": T0 + timedelta(seconds=s)}
+        for i, name, s in [("c", "web", 0), ("a", "web", 0), ("b", "cli", 0), ("d", "web", 5), ("e", "web", 10)]
+    ]
+
+    async def go():
+        await storage_backend.insert_status_checks(docs)
+        find = storage_backend.find_status_checks
+        assert [d["id"] for d in await find(None, None, None, None, False, 10)] == ["a", "b", "c", "d", "e"]
+        assert [d["id"] for d in await find(None, None, None, None, True, 10)] == ["e", "d", "c", "b", "a"]
+        page = await find("web", None, None, None, False, 2)
+        assert [d["id"] for d in page] == ["a", "c"]
+        after = (page[-1]["timestamp"], page[-1]["id"])
+        assert [d["id"] for d in await find("web", None, None, after, False, 2)] == ["d", "e"]
+        assert [d["id"] for d in await find("web", None, None, (T0, "c"), True, 5)] == ["a"]
+        window = await find(None, T0 + timedelta(seconds=5), T0 + timedelta(seconds=10), None, False, 10)
+        assert window == [docs[3]]
+    run(go())
+
+
+def test_rollups_accumulate(storage_backend):
+    minute = T0.replace(second=0, microsecond=0)
+    hour = minute.replace(minute=0)
+
+    async def go():
+        await storage_backend.increment_status_rollups([
+            ("minute", "web", minute, 2, minute + timedelta(days=7)),
+            ("hour", "web", hour, 2, None),
+        ])
+        await storage_backend.increment_status_rollups([
+            ("minute", "web", minute, 3, minute + timedelta(days=7)),
+            ("minute", "cli", minute + timedelta(minutes=1), 1, minute + timedelta(days=7)),
+        ])
+        rows = await storage_backend.find_status_rollups("minute", None, None, None, 10)
+        assert rows == [
+            {"client_name": "web", "bucket": minute, "count": 5},
+            {"client_name": "cli", "bucket": minute + timedelta(minutes=1), "count": 1},
+        ]
+        assert await storage_backend.find_status_rollups("minute", "cli", None, None, 10) == rows[1:]
+        assert await storage_backend.find_status_rollups("minute", None, minute + timedelta(minutes=1), None, 10) == rows[1:]
+        assert await storage_backend.find_status_rollups("hour", None, None, None, 10) == [
+            {"client_name": "web", "bucket": hour, "count": 2},
+        ]
+    run(go())
+
+
+def test_raw_stats_match_bucketing(storage_backend):
+    docs = [
+        {"id": str(i), "client_name": "web", "timestamp": T0 + timedelta(seconds=20 * i)} for i in range(7)
+    ]
+
+    async def go():
+        await storage_backend.insert_status_checks(docs)
+        minute = T0.replace(second=0, microsecond=0)
+        stats = await storage_backend.aggregate_status_stats("minute", None, None, None, 10)
+        assert [(s["bucket"], s["count"]) for s in stats] == [
+            (minute, 3), (minute + timedelta(minutes=1), 3), (minute + timedelta(minutes=2), 1),
+        ]
+    run(go())
+
+
+def test_rate_limit_windows(storage_backend):
+    now = datetime.utcnow()
+    live, expired = now + timedelta(minutes=1), now - timedelta(seconds=1)
+
+    async def go():
+        hits = [await storage_backend.hit_rate_limits([("ip:1", 2, live), ("global", 3, live)]) for _ in range(4)]
+        assert hits == [[True, True], [True, True], [False, True], [False, False]]
+        # Another key has its own window
+        assert await storage_backend.hit_rate_limits([("ip:2", 2, live)]) == [True]
+
+        # A window that has expired starts over
+        assert await storage_backend.hit_rate_limits([("old", 1, expired)]) == [True]
+        assert await storage_backend.hit_rate_limits([("old", 1, live)]) == [True]
+        assert await storage_backend.hit_rate_limits([("old", 1, live)]) == [False]
+    run(go())
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime
+
+from write_behind import NotifyWriteBehind
+
+
+class RecordingStorage:
+    def __init__(self):
+        self.batches = []
+        self.blocked = None
+        self.error = None
+
+    async def upsert_notify_emails(self, emails):
+        if self.blocked is not None:
+            await self.blocked.wait()
+        if self.error:
+            raise self.error
+        self.batches.append(dict(emails))
+
+
+def t(second):
+    return datetime(2026, 1, 1, 0, 0, second)
+
+
+def test_merges_by_email():
+    async def run():
+        storage = RecordingStorage()
+        writer = NotifyWriteBehind(storage, flush_interval=10)
+        writer.start()
+        for email, second in [("a@x.io", 1), ("b@x.io", 2), ("a@x.io", 3), ("a@x.io", 2)]:
+            assert await writer.submit(email, t(second))
+        await writer.close()
+        assert storage.batches == [{"a@x.io": (t(1), t(3)), "b@x.io": (t(2), t(2))}]
+
+    asyncio.run(run())
+
+
+def test_flushes_a_full_batch_without_waiting():
+    async def run():
+        storage = RecordingStorage()
+        writer = NotifyWriteBehind(storage, batch_size=3, flush_interval=10)
+        writer.start()
+        for i in range(4):
+            assert await writer.submit(f"{i}@x.io", t(i))
+        await asyncio.sleep(0.1)
+        assert [len(batch) for batch in storage.batches] == [3]
+        await writer.close()
+        assert [len(batch) for batch in storage.batches] == [3, 1]
+
+    asyncio.run(run())
+
+
+def test_flushes_after_the_interval():
+    async def run():
+        storage = RecordingStorage()
+        writer = NotifyWriteBehind(storage, flush_interval=0.05)
+        writer.start()
+        assert await writer.submit("a@x.io", t(1))
+        await asyncio.sleep(0.01)
+        assert storage.batches == []
+        await asyncio.sleep(0.15)
+        assert storage.batches == [{"a@x.io": (t(1), t(1))}]
+        await writer.close()
+
+    asyncio.run(run())
+
+
+def test_full_queue_falls_back_to_the_caller():
+    async def run():
+        storage = RecordingStorage()
+        storage.blocked = asyncio.Event()
+        writer = NotifyWriteBehind(storage, max_queue=2, batch_size=1, flush_interval=0, put_timeout=0.05)
+        # Not started: nothing would drain the queue
+        assert not await writer.submit("a@x.io", t(1))
+        writer.start()
+        accepted = [await writer.submit(f"{i}@x.io", t(i)) for i in range(4)]
+        # One batch stuck in the flush, two queued behind it
+        assert accepted == [True, True, True, False]
+        storage.blocked.set()
+        await writer.close()
+        assert sorted(email for batch in storage.batches for email in batch) == ["0@x.io", "1@x.io", "2@x.io"]
+
+    asyncio.run(run())
+
+
+def test_close_drains_and_stops():
+    async def run():
+        storage = RecordingStorage()
+        writer = NotifyWriteBehind(storage, batch_size=2, flush_interval=10)
+        writer.start()
+        for i in range(5):
+            assert await writer.submit(f"{i}@x.io", t(i))
+        # Without waiting out the flush interval
+        await asyncio.wait_for(writer.close(), 1)
+        assert sorted(email for batch in storage.batches for email in batch) == [f"{i}@x.io" for i in range(5)]
+        assert all(len(batch) <= 2 for batch in storage.batches)
+        assert not await writer.submit("late@x.io", t(9))
+        await writer.close()
+
+    asyncio.run(run())
+
+
+def test_failed_batches_go_to_on_failure():
+    async def run():
+        failed = []
+
+        async def on_failure(batch, exc):
+            failed.append((batch, exc))
+
+        storage = RecordingStorage()
+        storage.error = ConnectionError("down")
+        writer = NotifyWriteBehind(storage, flush_interval=10, on_failure=on_failure)
+        writer.start()
+        assert await writer.submit("a@x.io", t(1))
+        await writer.close()
+        assert [(batch, str(exc)) for batch, exc in failed] == [({"a@x.io": (t(1), t(1))}, "down")]
+
+    asyncio.run(run())